@@ -0,0 +1,62 @@
+# benchmarks/bench_encode.py
+
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+from PIL import Image, ImageChops, ImageDraw
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+from main import load_config
+from scripts.video_assembler import assemble_video
+
+SAMPLE_STORY = os.path.join(BASE_PATH, "story", "Aliens are taking over_v1_transcript.txt")
+SAMPLE_AUDIO = os.path.join(BASE_PATH, "audio", "Aliens are taking over_v2.wav")
+
+def make_scene_images(story_path, directory, size=512):
+    """Writes one placeholder still per sentence of the story, standing in for SD renders."""
+    with open(story_path, 'r', encoding='utf-8') as f:
+        sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+', f.read()) if s.strip()]
+    paths = []
+    for idx, sentence in enumerate(sentences, 1):
+        noise = Image.effect_noise((size, size), 24 + idx).convert("L")
+        gradient = Image.linear_gradient("L").resize((size, size)).rotate(idx * 25)
+        image = Image.merge("RGB", (gradient, noise, ImageChops.invert(gradient)))
+        ImageDraw.Draw(image).text((16, 16), sentence[:60], fill=(255, 255, 255))
+        path = os.path.join(directory, f"enhanced_image_{idx}.png")
+        image.save(path)
+        paths.append(path)
+    return paths
+
+def run(config, profiles, engines):
+    with tempfile.TemporaryDirectory() as workdir:
+        image_paths = make_scene_images(SAMPLE_STORY, workdir)
+        print(f"Encoding benchmark: {len(image_paths)} scenes, audio '{os.path.basename(SAMPLE_AUDIO)}'")
+        print(f"  {'engine':<8} {'profile':<10} {'seconds':>8} {'size (KB)':>10}")
+        for engine in engines:
+            for profile in profiles:
+                run_config = {**config, 'video_engine': engine, 'encoding_profile': profile}
+                output_path = os.path.join(workdir, f"{engine}_{profile}.mp4")
+                started = time.perf_counter()
+                result = assemble_video(image_paths, SAMPLE_AUDIO, output_path, run_config)
+                elapsed = time.perf_counter() - started
+                if result:
+                    print(f"  {engine:<8} {profile:<10} {elapsed:8.2f} {os.path.getsize(output_path) / 1024:10.1f}")
+                else:
+                    print(f"  {engine:<8} {profile:<10} {'failed (see logs)':>19}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark encoding profiles on the sample story/audio pair.")
+    parser.add_argument("--config", default=os.path.join(BASE_PATH, "config", "config.yaml"))
+    parser.add_argument("--profiles", nargs="+", help="Profiles to run (default: every profile in the config)")
+    parser.add_argument("--engines", nargs="+", default=["ffmpeg", "moviepy"], choices=["ffmpeg", "moviepy"])
+    parser.add_argument("--ffmpeg", help="Override ffmpeg_path from the config")
+    args = parser.parse_args()
+    config = load_config(args.config)
+    if args.ffmpeg:
+        config['ffmpeg_path'] = args.ffmpeg
+    profiles = args.profiles or list((config.get('encoding_profiles') or {'shorts': {}}).keys())
+    run(config, profiles, args.engines)
@@ -0,0 +1,83 @@
+# benchmarks/bench_enhance.py
+
+import os
+import io
+import sys
+import time
+import tempfile
+import statistics
+from PIL import Image, ImageChops, ImageEnhance
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.image_editor import enhance_image
+
+def make_sample_png(width, height):
+    # Noise over a gradient compresses roughly like a rendered image, unlike flat colour
+    noise = Image.effect_noise((width, height), 64).convert("L")
+    gradient = Image.linear_gradient("L").resize((width, height))
+    image = Image.merge("RGB", (noise, gradient, ImageChops.add(noise, gradient, scale=2.0)))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+def write_render(png_bytes, workdir, idx):
+    # generate_images writes every render to image_N.png (the checkpoint) in all flows
+    image_path = os.path.join(workdir, f"image_{idx}.png")
+    with open(image_path, "wb") as f:
+        f.write(png_bytes)
+    return image_path
+
+def legacy_path(png_bytes, workdir, idx):
+    # Previous flow: enhance_image re-opens image_N.png and runs two enhancer passes
+    image = Image.open(write_render(png_bytes, workdir, idx))
+    image = ImageEnhance.Brightness(image).enhance(1.2)
+    image = ImageEnhance.Contrast(image).enhance(1.3)
+    output_path = os.path.join(workdir, f"legacy_enhanced_{idx}.png")
+    image.save(output_path)
+    return output_path
+
+def fused_from_disk(png_bytes, workdir, idx):
+    # Single LUT pass, but still reading the render back from disk, at the old PNG level
+    output_path = os.path.join(workdir, f"disk_enhanced_{idx}.png")
+    return enhance_image(write_render(png_bytes, workdir, idx), output_path, compress_level=6)
+
+def fused_in_memory(png_bytes, workdir, idx, compress_level=6):
+    # resume_scenes flow: the render is kept in memory and enhanced without reading the file back
+    write_render(png_bytes, workdir, idx)
+    output_path = os.path.join(workdir, f"memory_{compress_level}_enhanced_{idx}.png")
+    return enhance_image(memoryview(png_bytes), output_path, compress_level=compress_level)
+
+def run(width=1024, height=1024, iterations=10):
+    png_bytes = make_sample_png(width, height)
+    flows = (
+        ("legacy", legacy_path),
+        ("fused, from disk", fused_from_disk),
+        ("fused, in memory", fused_in_memory),
+        ("fused, in memory, level 1", lambda *args: fused_in_memory(*args, compress_level=1)),
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        results = {}
+        for name, func in flows:
+            samples = []
+            for idx in range(iterations):
+                started = time.perf_counter()
+                output = func(png_bytes, workdir, idx)
+                samples.append(time.perf_counter() - started)
+            with Image.open(results["legacy"][1] if results else output) as reference, Image.open(output) as image:
+                max_diff = max(high for _, high in ImageChops.difference(reference, image).getextrema())
+            results[name] = (statistics.median(samples), output, os.path.getsize(output), max_diff)
+
+    legacy_seconds = results["legacy"][0]
+    print(f"Enhancement benchmark: {width}x{height}, {iterations} iterations (median per image)")
+    for name, (seconds, _, size, max_diff) in results.items():
+        print(f"  {name:<26} {seconds * 1000:8.1f} ms  {legacy_seconds / seconds:5.2f}x  "
+              f"{size / 1e6:6.2f} MB  max pixel difference {max_diff}")
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (1, 4):
+        print("Usage: python bench_enhance.py [<width> <height> <iterations>]")
+        sys.exit(1)
+    if len(sys.argv) == 4:
+        run(int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        run()
@@ -0,0 +1,73 @@
+# benchmarks/bench_motion.py
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+sys.path.insert(0, os.path.join(BASE_PATH, "benchmarks"))
+from main import load_config
+from bench_encode import SAMPLE_STORY, SAMPLE_AUDIO, make_scene_images
+from scripts.media_probe import probe_duration
+from scripts.video_assembler import assemble_video, get_encoding_profile, get_motion_settings, motion_frames
+
+def bench_frames(image_paths, profile, motion, frames_per_scene, workers):
+    """Renders motion frames into memory only and returns frames per second."""
+    count = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for scene_idx, image_path in enumerate(image_paths):
+            for _ in motion_frames(image_path, frames_per_scene, profile["width"], profile["height"],
+                                   motion, scene_idx, executor, workers * 2):
+                count += 1
+    return count / (time.perf_counter() - started)
+
+def bench_encode(image_paths, config, workdir):
+    """Encodes the sample with motion end to end and returns (seconds, frames per second)."""
+    profile = get_encoding_profile(config)
+    output_path = os.path.join(workdir, f"motion_{config['encoding_profile']}.mp4")
+    started = time.perf_counter()
+    if not assemble_video(image_paths, SAMPLE_AUDIO, output_path, config):
+        return None, None
+    elapsed = time.perf_counter() - started
+    frames = probe_duration(SAMPLE_AUDIO, config) * profile["fps"]
+    return elapsed, frames / elapsed
+
+def run(config, profiles, frames_per_scene, workers, target_fps):
+    with tempfile.TemporaryDirectory() as workdir:
+        image_paths = make_scene_images(SAMPLE_STORY, workdir)
+        print(f"Motion benchmark: {len(image_paths)} scenes, {workers} render threads")
+        print(f"  {'profile':<10} {'resample':<9} {'render fps':>10} {'encode fps':>10} {'encode s':>9} {'target':>8}")
+        for profile_name in profiles:
+            run_config = {**config, 'encoding_profile': profile_name}
+            profile = get_encoding_profile(run_config)
+            goal = target_fps or profile["fps"]
+            for resample in ("nearest", "bilinear", "bicubic"):
+                motion = {**get_motion_settings(config), "enabled": True, "resample": resample, "workers": workers}
+                render_fps = bench_frames(image_paths, profile, motion, frames_per_scene, workers)
+                elapsed, encode_fps = bench_encode(image_paths, {**run_config, 'motion': motion}, workdir)
+                if elapsed is None:
+                    print(f"  {profile_name:<10} {resample:<9} {render_fps:10.1f} {'failed (see logs)':>20}")
+                    continue
+                verdict = "ok" if encode_fps >= goal else "below"
+                print(f"  {profile_name:<10} {resample:<9} {render_fps:10.1f} {encode_fps:10.1f} {elapsed:9.2f} "
+                      f"{verdict:>5}@{goal}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Ken Burns frame generation and encoding throughput.")
+    parser.add_argument("--config", default=os.path.join(BASE_PATH, "config", "config.yaml"))
+    parser.add_argument("--profiles", nargs="+", help="Profiles to run (default: every profile in the config)")
+    parser.add_argument("--frames", type=int, default=60, help="Frames rendered per scene in the render-only pass")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Frame rendering threads")
+    parser.add_argument("--target-fps", type=float, help="Encode throughput target (default: the profile's fps, i.e., real time)")
+    parser.add_argument("--ffmpeg", help="Override ffmpeg_path from the config")
+    args = parser.parse_args()
+    config = load_config(args.config)
+    if args.ffmpeg:
+        config['ffmpeg_path'] = args.ffmpeg
+    profiles = args.profiles or list((config.get('encoding_profiles') or {'shorts': {}}).keys())
+    run(config, profiles, args.frames, args.workers, args.target_fps)
@@ -0,0 +1,176 @@
+# benchmarks/bench_pipeline.py
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+sys.path.insert(0, os.path.join(BASE_PATH, "benchmarks"))
+from main import load_config
+from bench_encode import SAMPLE_STORY, SAMPLE_AUDIO
+from stub_servers import OllamaStub, StableDiffusionStub
+from scripts.script_processor import process_script
+from scripts.prompt_generator import generate_prompts
+from scripts.image_generator import generate_images
+from scripts.image_editor import enhance_images
+from scripts.video_assembler import assemble_video
+from scripts.media_probe import probe_duration
+
+STAGES = ("script", "prompts", "images", "enhance", "video")
+
+def stub_config(config, llm, sd):
+    """Points the config at the stub servers and turns off everything that would skip work."""
+    return {
+        **config,
+        'ollama_api': llm.url,
+        'automatic1111_api': sd.url,
+        'llm_cache_enabled': False,
+        'image_cache_enabled': False,
+        'sd_seed': -1,
+    }
+
+def run_once(config, workdir, run_idx):
+    """
+    Runs every stage on the sample story and audio once.
+
+    Returns:
+        dict: stage -> (seconds, items) for the stages that ran; a failing stage ends the run.
+    """
+    timings = {}
+
+    def timed(stage, func, count):
+        started = time.perf_counter()
+        result = func()
+        timings[stage] = (time.perf_counter() - started, count(result))
+        return result
+
+    key_points, _ = timed("script", lambda: process_script(SAMPLE_STORY, config), lambda result: len(result[0]))
+    if not key_points:
+        return timings
+    prompts = timed("prompts", lambda: generate_prompts(key_points, config), len)
+    image_dir = os.path.join(workdir, f"run_{run_idx}")
+    os.makedirs(image_dir, exist_ok=True)
+    raw_paths = [os.path.join(image_dir, f"image_{idx}.png") for idx in range(1, len(prompts) + 1)]
+    images = {}  # Renders kept in memory, handed to enhancement like resume_scenes does
+    results = timed("images", lambda: generate_images(prompts, config, raw_paths, style="comics", images=images), sum)
+    rendered = [idx for idx, success in enumerate(results) if success]
+    if not rendered:
+        return timings
+    sources = [images.get(idx) or raw_paths[idx] for idx in rendered]
+    enhanced = [raw_paths[idx].replace("image_", "enhanced_image_") for idx in rendered]
+    enhanced = timed("enhance", lambda: [path for path, _ in enhance_images(sources, enhanced, config)], len)
+    output_path = os.path.join(image_dir, "video.mp4")
+    timed("video", lambda: assemble_video(enhanced, SAMPLE_AUDIO, output_path, config), lambda video: 1 if video else 0)
+    return timings
+
+def git_revision():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_PATH, capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+def summarize(runs):
+    """Median seconds and items per stage over the runs, plus the median total."""
+    summary = {}
+    for stage in STAGES:
+        samples = [run[stage] for run in runs if stage in run]
+        if samples:
+            summary[stage] = {
+                "seconds": statistics.median(seconds for seconds, _ in samples),
+                "items": statistics.median(items for _, items in samples),
+            }
+    totals = [sum(seconds for seconds, _ in run.values()) for run in runs if len(run) == len(STAGES)]
+    summary["total"] = {"seconds": statistics.median(totals) if totals else None, "items": 1 if totals else 0}
+    return summary
+
+def print_report(summary, audio_seconds, baseline=None):
+    print(f"  {'stage':<8} {'seconds':>9} {'items':>6} {'items/s':>9}" + (f" {'baseline s':>11} {'change':>8}" if baseline else ""))
+    for stage in (*STAGES, "total"):
+        result = summary.get(stage)
+        if not result or result["seconds"] is None:
+            print(f"  {stage:<8} {'failed (see logs)':>19}")
+            continue
+        seconds, items = result["seconds"], result["items"]
+        if stage == "total":
+            rate = f"{audio_seconds / seconds:8.2f}x"  # Seconds of video produced per second
+        else:
+            rate = f"{items / seconds:9.2f}" if seconds > 0 else f"{'-':>9}"
+        line = f"  {stage:<8} {seconds:9.3f} {items:6g} {rate}"
+        previous = (baseline or {}).get(stage, {}).get("seconds")
+        if baseline and previous:
+            line += f" {previous:11.3f} {(seconds - previous) / previous * 100:+7.1f}%"
+        print(line)
+
+def run(config, repeat, llm_latency, token_latency, sd_latency, image_size, key_points, output=None, compare=None):
+    baseline = None
+    if compare:
+        with open(compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    with OllamaStub(llm_latency, token_latency, key_points=key_points) as llm, \
+            StableDiffusionStub(sd_latency, image_size=image_size) as sd, \
+            tempfile.TemporaryDirectory() as workdir:
+        sd.warm()
+        run_config = stub_config(config, llm, sd)
+        audio_seconds = probe_duration(SAMPLE_AUDIO, run_config)
+        print(f"Pipeline benchmark: '{os.path.basename(SAMPLE_STORY)}' + '{os.path.basename(SAMPLE_AUDIO)}' "
+              f"({audio_seconds:.1f}s), {repeat} runs, engine '{run_config.get('video_engine', 'moviepy')}', "
+              f"profile '{run_config.get('encoding_profile', 'shorts')}'")
+        print(f"  stubs: LLM {llm_latency:.3f}s + {token_latency:.4f}s/token, SD {sd_latency:.3f}s/image"
+              + (f", images {image_size[0]}x{image_size[1]}" if image_size else ""))
+        runs = [run_once(run_config, workdir, idx) for idx in range(repeat)]
+        summary = summarize(runs)
+        print_report(summary, audio_seconds, baseline.get("stages") if baseline else None)
+        if baseline:
+            print(f"  baseline: {compare} (commit {baseline.get('commit') or 'unknown'})")
+        requests = {**llm.requests, **sd.requests}
+        print(f"  stub requests: {', '.join(f'{path} x{count}' for path, count in sorted(requests.items()))}")
+    if output:
+        result = {
+            "commit": git_revision(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "settings": {
+                "repeat": repeat, "llm_latency": llm_latency, "token_latency": token_latency,
+                "sd_latency": sd_latency, "image_size": image_size, "key_points": key_points,
+                "video_engine": run_config.get('video_engine'), "encoding_profile": run_config.get('encoding_profile'),
+            },
+            "stages": summary,
+            "runs": runs,
+        }
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"  results written to {output}")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the whole story -> video flow offline against stub Ollama and AUTOMATIC1111 servers."
+    )
+    parser.add_argument("--config", default=os.path.join(BASE_PATH, "config", "config.yaml"))
+    parser.add_argument("--repeat", type=int, default=3, help="Runs to take the median of")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Stub seconds before the first token of each LLM reply")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Stub seconds per streamed LLM token")
+    parser.add_argument("--sd-latency", type=float, default=0.0, help="Stub seconds per rendered image")
+    parser.add_argument("--image-size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), help="Size of the stub renders (default: as requested)")
+    parser.add_argument("--key-points", type=int, help="Scenes the stub LLM extracts (default: one per sentence)")
+    parser.add_argument("--engine", choices=["ffmpeg", "moviepy"], help="Override video_engine from the config")
+    parser.add_argument("--profile", help="Override encoding_profile from the config")
+    parser.add_argument("--ffmpeg", help="Override ffmpeg_path from the config")
+    parser.add_argument("--output", help="Write the results as JSON, e.g., to compare commits later")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+    config = load_config(args.config)
+    if args.engine:
+        config['video_engine'] = args.engine
+    if args.profile:
+        config['encoding_profile'] = args.profile
+    if args.ffmpeg:
+        config['ffmpeg_path'] = args.ffmpeg
+    run(config, max(1, args.repeat), args.llm_latency, args.token_latency, args.sd_latency,
+        tuple(args.image_size) if args.image_size else None, args.key_points, args.output, args.compare)
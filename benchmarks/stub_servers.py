@@ -0,0 +1,293 @@
+# benchmarks/stub_servers.py
+
+import io
+import re
+import json
+import time
+import zlib
+import base64
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from PIL import Image, ImageChops
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real servers
+    disable_nagle_algorithm = True  # Headers and body are written separately; do not let them wait on delayed ACKs
+    stub = None  # Set per server class by StubServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def _send(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.stub.handle(self, "GET", self.path, None)
+
+    def do_POST(self):
+        self.stub.handle(self, "POST", self.path, self._read_json())
+
+class StubServer:
+    """
+    A local HTTP server on 127.0.0.1 standing in for an external API during benchmarks.
+
+    Runs on a background thread until stop() is called. Subclasses implement `routes`,
+    a dict of (method, path) -> handler(request, body) returning (status, bytes).
+    `requests` counts the calls per path.
+    """
+
+    def __init__(self, port=0):
+        handler = type(f"{type(self).__name__}Handler", (_StubHandler,), {"stub": self})
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, request, method, path, body):
+        route = self.routes().get((method, path.split('?')[0]))
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+        if route is None:
+            request._send(404, b'{"detail": "Not Found"}')
+            return
+        status, payload = route(request, body)
+        if payload is not None:  # None: the route already streamed its own response
+            request._send(status, payload)
+
+    def routes(self):
+        return {}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class OllamaStub(StubServer):
+    """
+    Mimics Ollama's streaming /api/generate.
+
+    Script analysis requests get one key point per sentence of the script (up to
+    `key_points`) and every capitalised name as a character; prompt requests get a
+    detailed prompt of about `prompt_words` words, and JSON-format requests a batched
+    prompt object. Each request waits `latency` seconds (model time to first token),
+    then streams one word per `token_latency` seconds. Prompt-less requests (model
+    preloads) answer immediately.
+    """
+
+    def __init__(self, latency=0.0, token_latency=0.0, key_points=None, prompt_words=60, port=0):
+        super().__init__(port)
+        self.latency = latency
+        self.token_latency = token_latency
+        self.key_points = key_points
+        self.prompt_words = prompt_words
+
+    def routes(self):
+        return {("POST", "/api/generate"): self._generate}
+
+    def _analysis(self, script):
+        sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+', script) if s.strip()]
+        points = sentences[:self.key_points] if self.key_points else sentences
+        names = sorted(set(re.findall(r'\b[A-Z][a-z]+ [A-Z][a-z]+\b', script))) or ["Narrator"]
+        return ("Key Points:\n" + "\n".join(f"- {point}" for point in points)
+                + "\nCharacters:\n" + "\n".join(f"- {name}" for name in names))
+
+    def _prompt(self, point):
+        details = ("cinematic lighting, dramatic composition, highly detailed, volumetric fog, sharp focus, "
+                   "rich colour palette, wide angle shot, trending on artstation").split()
+        words = f"A detailed illustration of {point.strip()}".split()
+        while len(words) < self.prompt_words:
+            words += details
+        return " ".join(words[:max(self.prompt_words, len(point.split()) + 4)])
+
+    def _generate(self, request, body):
+        prompt = body.get("prompt")
+        if prompt is None:
+            return 200, json.dumps({"model": body.get("model"), "response": "", "done": True}).encode()
+        time.sleep(self.latency)
+        if body.get("format"):
+            points = re.findall(r'^\d+\. (.*)$', prompt, re.M)
+            text = json.dumps({"prompts": [{"index": idx, "prompt": self._prompt(point)} for idx, point in enumerate(points, 1)]})
+        elif prompt.startswith("Analyze"):
+            text = self._analysis(prompt.split("\n\n", 1)[-1])
+        else:
+            text = self._prompt(prompt.split("key point:", 1)[-1])
+
+        request.send_response(200)
+        request.send_header("Content-Type", "application/x-ndjson")
+        request.send_header("Transfer-Encoding", "chunked")
+        request.end_headers()
+        tokens = re.findall(r'\S+\s*', text)
+        for token in tokens:
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            line = json.dumps({"model": body.get("model"), "response": token, "done": False}) + "\n"
+            request.wfile.write(f"{len(line.encode()):x}\r\n{line}\r\n".encode())
+        line = json.dumps({"model": body.get("model"), "response": "", "done": True, "eval_count": len(tokens)}) + "\n"
+        request.wfile.write(f"{len(line.encode()):x}\r\n{line}\r\n0\r\n\r\n".encode())
+        return 200, None
+
+class StableDiffusionStub(StubServer):
+    """
+    Mimics AUTOMATIC1111's /sdapi/v1/txt2img, /sdapi/v1/progress and /sdapi/v1/options, and
+    lists its checkpoints and `loras` on /sdapi/v1/sd-models and /sdapi/v1/loras.
+
+    Returns `batch_size` base64 PNGs of the requested size (or `image_size` when given)
+    after `latency` seconds per image. Images are noise over a gradient, which compresses
+    like a real render; a few variants per size are encoded up front so the stub's own
+    PNG encoding does not count toward the measured time. The server has `checkpoint`
+    loaded and can also load those in `checkpoints`. Setting `sd_model_checkpoint` through
+    the options takes `swap_latency` seconds when the checkpoint changes and, like the
+    WebUI, answers 500 for a checkpoint it does not have. `swaps` counts the changes and
+    `renders` counts rendered images per loaded checkpoint.
+    """
+
+    VARIANTS = 4
+
+    def __init__(self, latency=0.0, image_size=None, swap_latency=0.0, checkpoint="stub_base", checkpoints=(),
+                 loras=(), port=0):
+        super().__init__(port)
+        self.checkpoints = {checkpoint, *checkpoints}
+        self.loras = list(loras)
+        self.latency = latency
+        self.image_size = image_size
+        self.swap_latency = swap_latency
+        self.checkpoint = checkpoint
+        self.swaps = 0
+        self.renders = {}
+        self.rendering = 0
+        self._images = {}
+        self._images_lock = threading.Lock()
+
+    def routes(self):
+        return {
+            ("POST", "/sdapi/v1/txt2img"): self._txt2img,
+            ("GET", "/sdapi/v1/progress"): self._progress,
+            ("GET", "/sdapi/v1/options"): self._get_options,
+            ("POST", "/sdapi/v1/options"): self._set_options,
+            ("GET", "/sdapi/v1/sd-models"): self._sd_models,
+            ("GET", "/sdapi/v1/loras"): self._list_loras,
+        }
+
+    def _title(self, checkpoint=None):
+        # Titles as the WebUI reports them: file name plus short hash
+        checkpoint = checkpoint or self.checkpoint
+        return f"{checkpoint}.safetensors [{zlib.crc32(checkpoint.encode()):010x}]"
+
+    def _sd_models(self, request, body):
+        with self._lock:
+            models = [{
+                "title": self._title(name), "model_name": name, "hash": f"{zlib.crc32(name.encode()):010x}",
+                "sha256": None, "filename": f"/models/Stable-diffusion/{name}.safetensors", "config": None,
+            } for name in sorted(self.checkpoints)]
+        return 200, json.dumps(models).encode()
+
+    def _list_loras(self, request, body):
+        loras = [{"name": name, "alias": name, "path": f"/models/Lora/{name}.safetensors", "metadata": {}}
+                 for name in self.loras]
+        return 200, json.dumps(loras).encode()
+
+    def _get_options(self, request, body):
+        with self._lock:
+            return 200, json.dumps({"sd_model_checkpoint": self._title(), "CLIP_stop_at_last_layers": 1}).encode()
+
+    def _set_options(self, request, body):
+        wanted = body.get("sd_model_checkpoint")
+        if wanted:
+            name = re.sub(r'(\.safetensors|\.ckpt)?( \[[0-9a-f]+\])?$', '', wanted)
+            if name not in self.checkpoints:
+                detail = f"model {wanted!r} not found"
+                return 500, json.dumps({"error": "RuntimeError", "detail": "", "body": "", "errors": detail}).encode()
+            with self._lock:
+                changed = name != self.checkpoint
+            if changed:
+                time.sleep(self.swap_latency)  # Unloading and loading the weights
+                with self._lock:
+                    self.checkpoint = name
+                    self.swaps += 1
+        return 200, b"null"
+
+    def _encoded(self, width, height, variant):
+        key = (width, height, variant)
+        with self._images_lock:
+            if key not in self._images:
+                noise = Image.effect_noise((width, height), 40 + 8 * variant).convert("L")
+                gradient = Image.linear_gradient("L").resize((width, height)).rotate(90 * variant)
+                image = Image.merge("RGB", (gradient, noise, ImageChops.invert(gradient)))
+                buffer = io.BytesIO()
+                image.save(buffer, "PNG")
+                self._images[key] = base64.b64encode(buffer.getvalue()).decode('ascii')
+            return self._images[key]
+
+    def warm(self, width=512, height=512):
+        """Encodes the image variants for a size ahead of the measured run."""
+        width, height = self.image_size or (width, height)
+        for variant in range(self.VARIANTS):
+            self._encoded(width, height, variant)
+
+    def _progress(self, request, body):
+        with self._lock:
+            busy = self.rendering
+        state = {"job_count": busy, "sampling_step": 0, "sampling_steps": 20 if busy else 0}
+        return 200, json.dumps({"progress": 0.5 if busy else 0.0, "eta_relative": 0.0, "state": state}).encode()
+
+    def _txt2img(self, request, body):
+        count = int(body.get("batch_size", 1)) * int(body.get("n_iter", 1))
+        width, height = self.image_size or (int(body.get("width", 512)), int(body.get("height", 512)))
+        with self._lock:
+            self.rendering += 1
+        try:
+            time.sleep(self.latency * count)
+        finally:
+            with self._lock:
+                self.rendering -= 1
+        with self._lock:
+            self.renders[self.checkpoint] = self.renders.get(self.checkpoint, 0) + count
+        seed = zlib.crc32(body.get("prompt", "").encode('utf-8'))
+        images = [self._encoded(width, height, (seed + i) % self.VARIANTS) for i in range(count)]
+        return 200, json.dumps({"images": images, "parameters": body, "info": "{}"}).encode()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Run the stub Ollama and AUTOMATIC1111 servers until interrupted.")
+    parser.add_argument("--llm-port", type=int, default=11434)
+    parser.add_argument("--sd-port", type=int, default=7860)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds per streamed token")
+    parser.add_argument("--sd-latency", type=float, default=0.0, help="Seconds per rendered image")
+    parser.add_argument("--image-size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), help="Override the requested image size")
+    parser.add_argument("--swap-latency", type=float, default=0.0, help="Seconds to load a different checkpoint")
+    args = parser.parse_args()
+    llm = OllamaStub(args.llm_latency, args.token_latency, port=args.llm_port).start()
+    sd = StableDiffusionStub(args.sd_latency, tuple(args.image_size) if args.image_size else None,
+                             swap_latency=args.swap_latency, port=args.sd_port).start()
+    print(f"Ollama stub at {llm.url}, AUTOMATIC1111 stub at {sd.url}. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        llm.stop()
+        sd.stop()
@@ -1,15 +1,27 @@
 # main.py
 
 import os
+import re
 import sys
 import yaml
-import subprocess
+import argparse
 import logging
-from scripts.script_processor import process_script
-from scripts.prompt_generator import generate_prompts
-from scripts.image_generator import list_available_models, list_available_loras, generate_image
-from scripts.image_editor import enhance_image
+from scripts.prompt_generator import generate_prompt
+from scripts.image_generator import list_available_models, list_available_loras
+from scripts.image_editor import enhance_images
 from scripts.video_assembler import assemble_video
+from scripts.llm_client import get_llm_client
+from scripts.image_cache import get_image_cache
+from scripts.model_catalog import load_model_catalog
+from scripts.sd_client import get_sd_client
+from scripts.pipeline import run_pipeline
+from scripts.scene_timing import plan_scene_durations
+from scripts.job_queue import JobQueue, Scheduler, get_job_queue_settings
+from scripts.instrumentation import start_trace, stage, traced
+from scripts.run_manifest import (
+    open_run, resume_script, resume_prompts, resume_scenes, checkpointed_prompt, record_prompt,
+    scene_signature, video_signature,
+)
 
 def load_config(config_path):
     try:
@@ -85,7 +97,325 @@ def select_from_list(options, prompt_text):
         except ValueError:
             print("Invalid input. Please enter a number.")
 
+@traced("render", hot=True)
+def render_scenes(key_points, config, image_dir, model=None, lora=None, style=None, prompts=None, on_frame=None, manifest=None):
+    """
+    Turns key points into enhanced scene images.
+
+    Uses the overlapped pipeline when `pipeline.enabled` is set; otherwise generates the
+    prompts (unless `prompts` is given), renders them and enhances the results. With a run
+    `manifest`, scenes checkpointed by an earlier run are reused and every new prompt and
+    image is checkpointed as soon as it is finished.
+
+    Returns:
+        tuple: (image_paths, scene_points) with the enhanced images in scene order and the
+        key point each one illustrates.
+    """
+    if (config.get('pipeline') or {}).get('enabled'):
+        return _render_scenes_pipelined(key_points, config, image_dir, model, lora, style, on_frame, manifest)
+
+    if prompts is None:
+        with stage("prompts"):
+            prompts = resume_prompts(manifest, key_points, config)
+        if not prompts:
+            return [], []
+    print(f"Generating and enhancing {len(prompts)} images...")
+    scenes = resume_scenes(
+        manifest, prompts, config, image_dir,
+        enhance=lambda sources, outputs: [path for path, _ in enhance_images(sources, outputs, config)],
+        model=model, lora=lora, style=style
+    )
+    succeeded = {idx for idx, _ in scenes}
+    for idx in range(len(prompts)):
+        if idx not in succeeded:
+            print(f"Failed to generate image for prompt {idx + 1}. Skipping.")
+    return [path for _, path in scenes], [key_points[idx] for idx, _ in scenes]
+
+def _render_scenes_pipelined(key_points, config, image_dir, model, lora, style, on_frame, manifest):
+    finished = {}
+    known_prompts = {}
+    for idx, point in enumerate(key_points):
+        prompt = checkpointed_prompt(manifest, idx, point, config)
+        if prompt is None:
+            continue
+        known_prompts[point] = prompt
+        path = manifest.artifact("enhanced", idx, scene_signature(prompt, config, model, lora, style))
+        if path:
+            finished[idx] = path
+            if on_frame:
+                on_frame(idx, path)
+    remaining = [idx for idx in range(len(key_points)) if idx not in finished]
+    if finished:
+        logging.info(f"Reusing {len(finished)} checkpointed scenes; {len(remaining)} left to render.")
+
+    if remaining:
+        client = get_llm_client(config)
+        used_prompts = {}
+
+        def prompt_fn(point, cfg):
+            prompt = known_prompts.get(point) or generate_prompt(point, cfg, client)
+            used_prompts[point] = prompt
+            if point not in known_prompts:
+                # Checkpoint right away so a crash before rendering does not cost the LLM call
+                for idx in remaining:
+                    if key_points[idx] == point:
+                        record_prompt(manifest, idx, point, prompt, config)
+            return prompt
+
+        def collect(position, path):
+            idx = remaining[position]
+            point = key_points[idx]
+            if path:
+                finished[idx] = path
+                if manifest and point in used_prompts:
+                    signature = scene_signature(used_prompts[point], config, model, lora, style)
+                    manifest.record_artifact("enhanced", idx, path, signature)
+            if on_frame:
+                on_frame(idx, path)
+
+        run_pipeline(
+            [key_points[idx] for idx in remaining], config, image_dir, model=model, lora=lora, style=style,
+            prompt_fn=prompt_fn, on_frame=collect, scene_numbers=[idx + 1 for idx in remaining]
+        )
+    ordered = sorted(finished.items())
+    return [path for _, path in ordered], [key_points[idx] for idx, _ in ordered]
+
+def log_run_stats(config):
+    llm_cache = get_llm_client(config).cache
+    if llm_cache:
+        llm_cache.log_stats()
+    image_cache = get_image_cache(config)
+    if image_cache:
+        image_cache.log_stats()
+    get_sd_client(config).log_stats()
+
+@traced("video", hot=True)
+def build_video(script_path, audio_path, image_paths, scene_points, config, output_path, manifest=None):
+    """
+    Times the scenes (aligned to the narration if configured) and assembles the video.
+
+    `output_path` may be a callable returning the path, so a path is only reserved when
+    a video actually has to be assembled. With a run `manifest`, a video already built
+    from the same images, audio and settings is reused if its checksum still matches.
+    """
+    durations = None
+    if config.get('scene_timing', 'uniform') == 'aligned':
+        print("Aligning scenes to the narration...")
+        durations = plan_scene_durations(script_path, audio_path, scene_points, config)
+        if durations is None:
+            print("Could not align scenes to the narration; using uniform timing.")
+    signature = None
+    if manifest:
+        signature = video_signature(image_paths, audio_path, config, durations)
+        existing = manifest.artifact("video", 0, signature)
+        if existing:
+            print(f"Reusing the video from the previous run: {existing}")
+            return existing
+    if callable(output_path):
+        output_path = output_path()
+    print("Assembling video...")
+    video = assemble_video(image_paths, audio_path, output_path, config, durations=durations)
+    if video and manifest:
+        manifest.record_artifact("video", 0, video, signature)
+    return video
+
+def story_key(path):
+    """
+    Returns the name a story and its narration are matched on: the file stem, lowercased,
+    without trailing '_transcript' or version ('_v2') suffixes.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0].lower().strip()
+    previous = None
+    while stem != previous:
+        previous = stem
+        stem = re.sub(r'[_\- ]+(transcript|script|story|audio|narration|v\d+)$', '', stem)
+    return stem
+
+def pair_stories_with_audio(story_paths, audio_paths):
+    """
+    Pairs each story with the audio file of the same story_key. When several audio files
+    match, the last one in name order (usually the newest version) is used. A lone story
+    and a lone audio file are paired even if their names differ.
+
+    Returns:
+        tuple: (pairs, unmatched_stories) where pairs is a list of (story_path, audio_path).
+    """
+    if len(story_paths) == 1 and len(audio_paths) == 1:
+        return [(story_paths[0], audio_paths[0])], []
+    audio_by_key = {}
+    for audio_path in sorted(audio_paths):
+        audio_by_key[story_key(audio_path)] = audio_path
+    pairs, unmatched = [], []
+    for story_path in sorted(story_paths):
+        audio_path = audio_by_key.get(story_key(story_path))
+        if audio_path:
+            pairs.append((story_path, audio_path))
+        else:
+            unmatched.append(story_path)
+    return pairs, unmatched
+
+def unique_output_path(directory, name, extension=".mp4"):
+    """
+    Returns `<directory>/<name><extension>`, or the first free `<name>_<n><extension>`.
+    The file is created empty to reserve it, so concurrent jobs never share a path.
+    """
+    os.makedirs(directory, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('_') or "video"
+    counter = 1
+    while True:
+        candidate = os.path.join(directory, f"{slug}{extension}" if counter == 1 else f"{slug}_{counter}{extension}")
+        try:
+            with open(candidate, 'x'):
+                return candidate
+        except FileExistsError:
+            counter += 1
+
+def collect_files(path, extensions):
+    """Returns `path` itself if it is a file, otherwise its files with the given extensions."""
+    if os.path.isfile(path):
+        return [path]
+    if not os.path.isdir(path):
+        return []
+    return sorted(
+        os.path.join(path, f) for f in os.listdir(path)
+        if os.path.isfile(os.path.join(path, f)) and os.path.splitext(f)[1].lower() in extensions
+    )
+
+def render_story(script_path, audio_path, config, output_dir, image_root, model=None, lora=None, style=None, fresh=False):
+    """
+    Runs one story end to end without any prompts: key points, scene images and video.
+
+    Images go to the story's run directory (or `<image_root>/<story_key>/` when runs are
+    not resumable) and the video to a unique path in `output_dir`. A rerun resumes from
+    the run's checkpoints unless `fresh` is set.
+
+    Returns:
+        str: Path to the video, or None if the job failed.
+    """
+    name = story_key(script_path)
+    manifest = open_run(config, script_path, fresh=fresh)
+    with stage("script"):
+        key_points, _ = resume_script(manifest, script_path, config)
+    if not key_points:
+        logging.error(f"No key points extracted from '{script_path}'.")
+        return None
+    if manifest:
+        image_dir = manifest.image_dir
+    else:
+        image_dir = os.path.join(image_root, re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('_') or "story")
+    image_paths, scene_points = render_scenes(
+        key_points, config, image_dir, model=model, lora=lora, style=style, manifest=manifest
+    )
+    if not image_paths:
+        logging.error(f"No images were generated for '{script_path}'.")
+        return None
+    reserved = []
+
+    def reserve():
+        reserved.append(unique_output_path(output_dir, name))
+        return reserved[-1]
+
+    video = build_video(script_path, audio_path, image_paths, scene_points, config, reserve, manifest=manifest)
+    if not video and reserved and os.path.getsize(reserved[0]) == 0:
+        os.remove(reserved[0])  # Release the reserved name
+    return video
+
+def run_batch(args, config, base_path):
+    """Renders every story/audio pair found in `args.stories` and `args.audio` in one process."""
+    story_paths = collect_files(args.stories or os.path.join(base_path, "story"), ['.txt'])
+    audio_paths = collect_files(args.audio or os.path.join(base_path, "audio"), ['.wav', '.mp3'])
+    pairs, unmatched = pair_stories_with_audio(story_paths, audio_paths)
+    for story_path in unmatched:
+        print(f"No audio found for '{story_path}'. Skipping.")
+    if not pairs:
+        print("No story/audio pairs to render.")
+        return 1
+
+    model = args.model or config.get('sd_model')
+    lora = args.lora or config.get('lora_model')
+    style = args.style or config.get('default_style', 'comics')
+    if model:
+        config['sd_model'] = model
+    if lora:
+        config['lora_model'] = lora
+    output_dir = args.output_dir or os.path.join(base_path, "outputs", "videos")
+    image_root = os.path.join(base_path, "outputs", "images")
+
+    if args.queue:
+        # Persist the jobs and let the scheduler overlap them; rerunning only queues jobs not already queued or done
+        job_queue = JobQueue(os.path.join(base_path, get_job_queue_settings(config)["path"]))
+        queued = sum(job_queue.add(story_path, audio_path, model=model, lora=lora, style=style)[1] for story_path, audio_path in pairs)
+        print(f"Queued {queued} jobs ({len(pairs) - queued} already queued or done); running them with the scheduler...")
+        get_llm_client(config).warm_up()
+        depth = Scheduler(job_queue, config, workers=args.workers, output_dir=output_dir, image_root=image_root).run()
+        log_run_stats(config)
+        print(f"\nQueue finished: {depth['done']} done, {depth['failed']} failed, {depth['pending']} pending.")
+        return 1 if depth['failed'] else 0
+
+    # One warmed LLM client (and the shared SD session) serves every job
+    get_llm_client(config).warm_up()
+    print(f"Rendering {len(pairs)} stories with model '{model}', LoRA '{lora}', style '{style}'.")
+    failures = 0
+    for number, (story_path, audio_path) in enumerate(pairs, 1):
+        print(f"\n[{number}/{len(pairs)}] {os.path.basename(story_path)} + {os.path.basename(audio_path)}")
+        try:
+            with stage("story", story=os.path.basename(story_path)):
+                video = render_story(
+                    story_path, audio_path, config, output_dir, image_root, model=model, lora=lora, style=style,
+                    fresh=args.fresh
+                )
+        except Exception as e:
+            logging.error(f"Batch job for '{story_path}' failed: {e}")
+            video = None
+        if video:
+            print(f"Video created at {video}")
+        else:
+            failures += 1
+            print(f"Failed to render '{story_path}'. Check logs for details.")
+    log_run_stats(config)
+    print(f"\nBatch finished: {len(pairs) - failures}/{len(pairs)} videos rendered.")
+    return 1 if failures else 0
+
+def _add_run_options(parser):
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached LLM responses and rendered images for this run")
+    parser.add_argument("--fresh", action="store_true", help="Discard the checkpoints of earlier runs of the story and start over")
+    parser.add_argument("--profile", action="store_true", help="Run cProfile around the rendering and video stages and print the hot spots")
+
+def parse_args(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(
+        description="YouTube Shorts Automation Tool",
+        epilog="Pass a story and an audio file (main.py <story> <audio>) to skip choosing them interactively."
+    )
+    _add_run_options(parser)
+    parser.set_defaults(story=None, audio=None)
+    subparsers = parser.add_subparsers(dest="command")
+    batch_parser = subparsers.add_parser("batch", help="Render many stories without any prompts")
+    batch_parser.add_argument("--stories", help="Story .txt file or directory (default: story/)")
+    batch_parser.add_argument("--audio", help="Audio .wav/.mp3 file or directory (default: audio/)")
+    batch_parser.add_argument("--model", help="Stable Diffusion model (default: sd_model from the config)")
+    batch_parser.add_argument("--lora", help="LoRA model (default: lora_model from the config)")
+    batch_parser.add_argument("--style", help="Image style (default: default_style from the config)")
+    batch_parser.add_argument("--output-dir", help="Directory for the videos (default: outputs/videos)")
+    batch_parser.add_argument("--queue", action="store_true", help="Run the jobs through the persistent job queue with parallel workers")
+    batch_parser.add_argument("--workers", type=int, help="Concurrent jobs with --queue (default: job_queue.workers from the config)")
+    batch_parser.add_argument("--no-cache", action="store_true", default=argparse.SUPPRESS, help=argparse.SUPPRESS)
+    batch_parser.add_argument("--fresh", action="store_true", default=argparse.SUPPRESS, help=argparse.SUPPRESS)
+    batch_parser.add_argument("--profile", action="store_true", default=argparse.SUPPRESS, help=argparse.SUPPRESS)
+
+    positional = [arg for arg in argv if not arg.startswith("-")]
+    if positional and positional[0] not in subparsers.choices:
+        # The single-run form, `main.py <story> [<audio>]`, replaces the interactive file selection
+        parser = argparse.ArgumentParser(description="YouTube Shorts Automation Tool")
+        _add_run_options(parser)
+        parser.add_argument("story", help="Story .txt file")
+        parser.add_argument("audio", nargs="?", help="Audio .wav/.mp3 file (default: choose interactively)")
+        parser.set_defaults(command=None)
+    return parser.parse_args(argv)
+
 def main():
+    args = parse_args()
+
     # Configure logging
     logging.basicConfig(
         filename=os.path.join("logs", "app.log"),
@@ -101,6 +431,15 @@ def main():
     if not config:
         print("Failed to load configuration. Check logs for details.")
         sys.exit(1)
+    if args.no_cache:
+        config['llm_cache_enabled'] = False
+        config['image_cache_enabled'] = False
+
+    # Per-stage timings go to a JSONL trace; the summary table is printed on exit
+    start_trace(config, args.command or "interactive", profile=args.profile)
+
+    if args.command == "batch":
+        sys.exit(run_batch(args, config, base_path))
 
     # Define default directories
     scripts_dir = os.path.join(base_path, "story")
@@ -110,20 +449,32 @@ def main():
     os.makedirs(scripts_dir, exist_ok=True)
     os.makedirs(audio_dir, exist_ok=True)
 
-    # Select script file with .txt extension
-    script_path = select_file_from_directory(scripts_dir, "script", extensions=['.txt'])
+    # Select script file with .txt extension (unless given on the command line)
+    script_path = args.story or select_file_from_directory(scripts_dir, "script", extensions=['.txt'])
 
     # Select audio file with .wav and .mp3 extensions
-    audio_path = select_file_from_directory(audio_dir, "audio", extensions=['.wav', '.mp3'])
+    audio_path = args.audio or select_file_from_directory(audio_dir, "audio", extensions=['.wav', '.mp3'])
+    for label, path in (("Script", script_path), ("Audio", audio_path)):
+        if not os.path.isfile(path):
+            print(f"{label} file not found: {path}")
+            sys.exit(1)
 
-    # List available models and LoRAs
+    # List available models and LoRAs (from the catalog index, refreshed incrementally)
     models_dir = os.path.join(base_path, config.get('models_directory', 'models'))
     loras_dir = os.path.join(base_path, config.get('loras_directory', 'loras'))
-    available_models = list_available_models(models_dir)
-    available_loras = list_available_loras(loras_dir)
+    with stage("catalog"):
+        catalog = load_model_catalog(config, models_dir, loras_dir, sd_client=get_sd_client(config))
+    if catalog:
+        available_models = catalog.choices("model")
+        available_loras = catalog.choices("lora")
+    else:
+        available_models = list_available_models(models_dir)
+        available_loras = list_available_loras(loras_dir)
 
-    # Process script
-    key_points, characters = process_script(script_path, config)
+    # Process script (reusing the analysis from an interrupted run of the same story)
+    manifest = open_run(config, script_path, fresh=args.fresh, base_path=base_path)
+    with stage("script"):
+        key_points, characters = resume_script(manifest, script_path, config)
     if not key_points:
         print("No key points extracted from the script. Exiting.")
         sys.exit(1)
@@ -159,40 +510,49 @@ def main():
     else:
         config['lora_model'] = selected_lora
 
-    # Generate prompts
-    print("\nGenerating prompts based on key points...")
-    prompts = generate_prompts(key_points, config)
-    if not prompts:
-        print("Failed to generate prompts. Exiting.")
-        sys.exit(1)
+    image_dir = manifest.image_dir if manifest else os.path.join(base_path, "outputs", "images")
+    pipeline_settings = config.get('pipeline') or {}
+    if pipeline_settings.get('enabled'):
+        # Prompts are rendered as soon as they are produced, so approval happens up front
+        print(f"\nNumber of images to be generated: {len(key_points)}")
+        approval = get_user_input("Generate and render prompts without reviewing them first? (yes/no)", default="yes").lower()
+        if approval not in ['yes', 'y']:
+            print("Operation cancelled by the user.")
+            sys.exit(0)
+        print("\nGenerating prompts and images in a pipeline...")
+        image_paths, scene_points = render_scenes(
+            key_points, config, image_dir, model=selected_model, lora=selected_lora, style=style,
+            on_frame=lambda idx, path: print(f"Scene {idx + 1}/{len(key_points)} {'ready' if path else 'failed'}."),
+            manifest=manifest
+        )
+    else:
+        # Generate prompts
+        print("\nGenerating prompts based on key points...")
+        with stage("prompts"):
+            prompts = resume_prompts(manifest, key_points, config)
+        if not prompts:
+            print("Failed to generate prompts. Exiting.")
+            sys.exit(1)
 
-    # Display prompts
-    print("\nGenerated Prompts:")
-    for idx, prompt in enumerate(prompts, 1):
-        print(f"{idx}. {prompt}")
-    print(f"\nNumber of images to be generated: {len(prompts)}")
-
-    # Get user approval
-    approval = get_user_input("Do you approve the prompts and settings? (yes/no)", default="yes").lower()
-    if approval not in ['yes', 'y']:
-        print("Operation cancelled by the user.")
-        sys.exit(0)
-
-    # Generate images
-    image_dir = os.path.join(base_path, "outputs", "images")
-    os.makedirs(image_dir, exist_ok=True)
-    image_paths = []
-    for idx, prompt in enumerate(prompts, 1):
-        image_path = os.path.join(image_dir, f"image_{idx}.png")
-        print(f"Generating image {idx}/{len(prompts)}...")
-        success = generate_image(prompt, config, image_path, model=selected_model, lora=selected_lora, style=style)
-        if success:
-            # Enhance image
-            enhanced_path = os.path.join(image_dir, f"enhanced_image_{idx}.png")
-            enhance_image(image_path, enhanced_path)
-            image_paths.append(enhanced_path)
-        else:
-            print(f"Failed to generate image for prompt {idx}. Skipping.")
+        # Display prompts
+        print("\nGenerated Prompts:")
+        for idx, prompt in enumerate(prompts, 1):
+            print(f"{idx}. {prompt}")
+        print(f"\nNumber of images to be generated: {len(prompts)}")
+
+        # Get user approval
+        approval = get_user_input("Do you approve the prompts and settings? (yes/no)", default="yes").lower()
+        if approval not in ['yes', 'y']:
+            print("Operation cancelled by the user.")
+            sys.exit(0)
+
+        # Generate and enhance images
+        image_paths, scene_points = render_scenes(
+            key_points, config, image_dir, model=selected_model, lora=selected_lora, style=style, prompts=prompts,
+            manifest=manifest
+        )
+
+    log_run_stats(config)
 
     if not image_paths:
         print("No images were successfully generated. Exiting.")
@@ -202,8 +562,7 @@ def main():
     video_output_dir = os.path.join(base_path, "outputs", "videos")
     os.makedirs(video_output_dir, exist_ok=True)
     output_video_path = os.path.join(video_output_dir, "output_video.mp4")
-    print("Assembling video...")
-    video = assemble_video(image_paths, audio_path, output_video_path, config)
+    video = build_video(script_path, audio_path, image_paths, scene_points, config, output_video_path, manifest=manifest)
     if video:
         print(f"Video created successfully at {video}")
     else:
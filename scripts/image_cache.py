@@ -0,0 +1,231 @@
+# scripts/image_cache.py
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import sqlite3
+import hashlib
+import logging
+import threading
+
+def normalize_payload(payload):
+    """
+    Returns a canonical copy of a txt2img payload for hashing.
+
+    Strings are stripped and numbers that are whole are stored as ints, so
+    payloads that render the same image hash to the same key.
+    """
+    normalized = {}
+    for key, value in payload.items():
+        if isinstance(value, str):
+            value = value.strip()
+        elif isinstance(value, float) and value.is_integer():
+            value = int(value)
+        normalized[key] = value
+    return normalized
+
+def make_image_key(payload):
+    material = json.dumps(normalize_payload(payload), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+def is_cacheable(payload):
+    # A random seed (-1) renders a different image every time, so it is never cached
+    seed = payload.get("seed", -1)
+    return seed is not None and int(seed) >= 0
+
+class ImageCache:
+    """
+    Content-addressed store of rendered images.
+
+    Images are kept as sharded files (`<dir>/<key[:2]>/<key>.png`) with a SQLite index
+    tracking size and last use. Least recently used images are evicted once the store
+    grows beyond `max_bytes`. Safe to share between threads.
+
+    Args:
+        directory (str): Root directory of the store (e.g., 'outputs/cache/images').
+        max_bytes (int): Size budget for stored images.
+    """
+
+    def __init__(self, directory, max_bytes=2 * 1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            "key TEXT PRIMARY KEY, prompt TEXT, size INTEGER, created REAL, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS images_last_used ON images (last_used)")
+        self._conn.commit()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.png")
+
+    def get(self, key):
+        """Returns the stored file path for `key`, or None on a miss."""
+        path = self._path(key)
+        with self._lock:
+            row = self._conn.execute("SELECT key FROM images WHERE key = ?", (key,)).fetchone()
+            if row is None or not os.path.exists(path):
+                if row is not None:
+                    self._conn.execute("DELETE FROM images WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE images SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return path
+
+    def contains(self, key):
+        """Returns whether `key` is stored, without counting a hit or miss or touching its last use."""
+        with self._lock:
+            row = self._conn.execute("SELECT key FROM images WHERE key = ?", (key,)).fetchone()
+        return row is not None and os.path.exists(self._path(key))
+
+    def record_misses(self, count=1):
+        """Counts lookups answered without get(), e.g. a batch skipped because one image is missing."""
+        with self._lock:
+            self.misses += count
+
+    def fetch(self, key, output_path):
+        """Copies the cached image for `key` to `output_path`. Returns True on a hit."""
+        path = self.get(key)
+        if path is None:
+            return False
+        shutil.copyfile(path, output_path)
+        return True
+
+    def put(self, key, image_bytes, prompt=""):
+        def write(tmp_path):
+            with open(tmp_path, "wb") as f:
+                f.write(image_bytes)
+        self._store(key, prompt, write)
+
+    def put_file(self, key, source_path, prompt=""):
+        """Stores a copy of an image already on disk without reading it into memory."""
+        self._store(key, prompt, lambda tmp_path: shutil.copyfile(source_path, tmp_path))
+
+    def _store(self, key, prompt, write):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A temporary file per writer, so workers storing the same key never share one
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=f"{key}.", suffix=".tmp", delete=False) as tmp:
+            tmp_path = tmp.name
+        try:
+            write(tmp_path)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO images (key, prompt, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, prompt, size, now, now)
+            )
+            self._evict(self.max_bytes)
+            self._conn.commit()
+
+    def _evict(self, max_bytes):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+        removed = 0
+        if total <= max_bytes:
+            return removed
+        for key, size in self._conn.execute("SELECT key, size FROM images ORDER BY last_used ASC").fetchall():
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            self._conn.execute("DELETE FROM images WHERE key = ?", (key,))
+            total -= size
+            removed += 1
+        self.evictions += removed
+        return removed
+
+    def prune(self, max_bytes=None):
+        """Evicts least recently used images until the store fits `max_bytes`. Returns the count removed."""
+        with self._lock:
+            removed = self._evict(self.max_bytes if max_bytes is None else max_bytes)
+            self._conn.commit()
+        return removed
+
+    def entries(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT key, size, created, last_used, prompt FROM images ORDER BY last_used DESC"
+            ).fetchall()
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logging.info(
+            f"Image cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions, "
+            f"{stats['entries']} images / {stats['bytes']} bytes in {self.directory}."
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_image_cache(config):
+    """
+    Returns the shared ImageCache for the given config, or None if `image_cache_enabled` is false.
+    """
+    if not config.get('image_cache_enabled', True):
+        return None
+    directory = config.get('image_cache_dir', os.path.join("outputs", "cache", "images"))
+    with _caches_lock:
+        cache = _caches.get(directory)
+        if cache is None:
+            max_bytes = int(config.get('image_cache_max_mb', 2048)) * 1024 * 1024
+            cache = ImageCache(directory, max_bytes=max_bytes)
+            _caches[directory] = cache
+        return cache
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect or prune the rendered image cache.")
+    parser.add_argument("cache_dir", help="Image cache directory (e.g., outputs/cache/images)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Show entry count and total size")
+    list_parser = subparsers.add_parser("list", help="List cached images, most recently used first")
+    list_parser.add_argument("--limit", type=int, default=20)
+    prune_parser = subparsers.add_parser("prune", help="Evict least recently used images")
+    prune_parser.add_argument("--max-mb", type=float, default=0, help="Size to prune down to (0 clears the cache)")
+    args = parser.parse_args()
+
+    cache = ImageCache(args.cache_dir)
+    if args.command == "stats":
+        stats = cache.stats()
+        print(f"{stats['entries']} images, {stats['bytes'] / (1024 * 1024):.1f} MB in {args.cache_dir}")
+    elif args.command == "list":
+        for key, size, created, last_used, prompt in cache.entries()[:args.limit]:
+            used = time.strftime('%Y-%m-%d %H:%M', time.localtime(last_used))
+            print(f"{key[:16]}  {size / 1024:8.1f} KB  {used}  {prompt[:60]}")
+    elif args.command == "prune":
+        removed = cache.prune(int(args.max_mb * 1024 * 1024))
+        print(f"Removed {removed} images.")
@@ -1,10 +1,23 @@
 # scripts/image_generator.py
 
 import yaml
-import requests
 import os
 import logging
-import base64
+import io
+import time
+import shutil
+import binascii
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+try:
+    from scripts.image_cache import get_image_cache, make_image_key, is_cacheable
+    from scripts.instrumentation import traced
+    from scripts.sd_client import get_sd_client
+except ImportError:
+    from image_cache import get_image_cache, make_image_key, is_cacheable
+    from instrumentation import traced
+    from sd_client import get_sd_client
 
 def load_config(config_path):
     try:
@@ -31,44 +44,352 @@ def list_available_loras(loras_directory):
         logging.error(f"Error listing LoRAs: {e}")
         return []
 
-def generate_image(prompt, config, output_path, model=None, lora=None, style=None):
+def build_payload(prompt, config, model=None, lora=None, style=None, seed=None):
+    payload = {
+        "prompt": prompt,
+        "steps": 20,  # Example steps
+        "cfg_scale": 7.0,  # Example cfg scale
+        "width": 512,
+        "height": 512,
+        "sampler_index": "Euler a",  # Example sampler
+        "seed": config.get('sd_seed', -1) if seed is None else seed,  # -1 for a random seed
+        "negative_prompt": "",
+    }
+    if model:
+        payload["model"] = model
+    if lora:
+        payload["lora"] = lora
+    # Include style in the prompt if necessary
+    if style:
+        payload["prompt"] += f", style of {style}"
+    return payload
+
+class _Base64Writer:
+    """
+    Decodes base64 text incrementally, 4 characters at a time, into a file path or an
+    already open binary stream (which is left open).
+    """
+
+    def __init__(self, target):
+        self.owned = isinstance(target, str)
+        self.file = open(target, "wb") if self.owned else target
+        self.pending = b""
+
+    def feed(self, data):
+        if not self.file:
+            return
+        data = self.pending + data.replace(b"\\", b"")
+        usable = len(data) - len(data) % 4
+        self.pending = data[usable:]
+        if usable:
+            self.file.write(binascii.a2b_base64(data[:usable]))
+
+    def close(self):
+        if not self.file:
+            return
+        if self.pending:
+            self.file.write(binascii.a2b_base64(self.pending + b"=" * (-len(self.pending) % 4)))
+        if self.owned:
+            self.file.close()
+
+def _stream_images(chunks, outputs):
+    """
+    Incrementally parses a txt2img JSON response and decodes the top-level "images" array
+    straight to disk (or into in-memory buffers).
+
+    Only the chunk being parsed and at most three undecoded base64 characters are held in
+    memory, instead of the full JSON document, the base64 strings and the decoded bytes.
+    Images beyond `outputs` (e.g., grids added by extensions) are skipped, and the
+    rest of the response (parameters, info) is never parsed.
+
+    Args:
+        chunks (iterable): Byte chunks of the response body.
+        outputs (list): Destination file path or writable binary stream for each
+            returned image, in order.
+
+    Returns:
+        list: The outputs that were written.
+    """
+    written = []
+    depth = 0
+    in_string = escaped = False
+    key = bytearray()
+    expect = None  # b":" then b"[" after the "images" key
+    in_array = False
+    writer = None
+    for chunk in chunks:
+        pos = 0
+        while pos < len(chunk):
+            if writer is not None:
+                # Inside an image string: hand everything up to the closing quote to the decoder
+                end = chunk.find(b'"', pos)
+                if end == -1:
+                    writer.feed(chunk[pos:])
+                    break
+                writer.feed(chunk[pos:end])
+                writer.close()
+                if writer.file:
+                    written.append(outputs[len(written)])
+                writer = None
+                pos = end + 1
+                continue
+            byte = chunk[pos:pos + 1]
+            pos += 1
+            if in_array:
+                if byte == b'"':
+                    idx = len(written)
+                    writer = _Base64Writer(outputs[idx] if idx < len(outputs) else None)
+                elif byte == b"]":
+                    return written
+                continue
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif byte == b"\\":
+                    escaped = True
+                elif byte == b'"':
+                    in_string = False
+                    if depth == 1 and bytes(key) == b"images":
+                        expect = b":"
+                elif depth == 1 and len(key) < 16:
+                    key += byte
+                continue
+            if byte.isspace():
+                continue
+            if expect is not None:
+                if byte == expect:
+                    if expect == b"[":
+                        in_array = True
+                        expect = None
+                    else:
+                        expect = b"["
+                    continue
+                expect = None
+            if byte == b'"':
+                in_string = True
+                key = bytearray()
+            elif byte in (b"{", b"["):
+                depth += 1
+            elif byte in (b"}", b"]"):
+                depth -= 1
+    if writer is not None:
+        writer.close()
+        raise ValueError("Response ended inside an image string.")
+    return written
+
+def _render_to_files(payload, config, outputs):
+    """
+    Posts a txt2img payload through the shared SD client and streams each returned image
+    straight into `outputs`. A response that breaks off is requested again, rewriting
+    the outputs from the start.
+    """
+    def consume(response):
+        for output in outputs:
+            if not isinstance(output, str):
+                output.seek(0)
+                output.truncate()
+        # Assuming the API returns images as base64-encoded strings
+        return _stream_images(response.iter_content(chunk_size=64 * 1024), outputs)
+
+    written = get_sd_client(config).txt2img(payload, consume=consume)
+    if not written:
+        raise ValueError("No images in Stable Diffusion API response.")
+    return written
+
+def _save_buffer(buffer, output_path):
+    with open(output_path, 'wb') as f:
+        f.write(buffer.getbuffer())
+
+def generate_image(prompt, config, output_path, model=None, lora=None, style=None, seed=None, buffer=None):
+    """
+    Renders one image to `output_path`. Returns True on success.
+
+    With `buffer` (e.g., an io.BytesIO), a fresh render is streamed into it and then
+    written out, so the caller also has the encoded image without reading the file back.
+    On a cache hit the buffer is left empty.
+    """
     try:
-        payload = {
-            "prompt": prompt,
-            "steps": 20,  # Example steps
-            "cfg_scale": 7.0,  # Example cfg scale
-            "width": 512,
-            "height": 512,
-            "sampler_index": "Euler a",  # Example sampler
-            "seed": -1,  # Random seed
-            "negative_prompt": "",
-        }
-        if model:
-            payload["model"] = model
-        if lora:
-            payload["lora"] = lora
-        # Include style in the prompt if necessary
-        if style:
-            payload["prompt"] += f", style of {style}"
-        
+        payload = build_payload(prompt, config, model=model, lora=lora, style=style, seed=seed)
+
+        # Renders with a fixed seed are deterministic, so they can be served from the image cache
+        cache = get_image_cache(config) if is_cacheable(payload) else None
+        cache_key = make_image_key(payload) if cache else None
+        if cache and cache.fetch(cache_key, output_path):
+            logging.info(f"Image cache hit ({cache_key[:12]}); copied to {output_path}.")
+            return True
+
         logging.info(f"Sending request to Stable Diffusion API with prompt: {prompt}")
-        response = requests.post(
-            f"{config['automatic1111_api']}/sdapi/v1/txt2img",
-            json=payload
-        )
-        response.raise_for_status()
-        data = response.json()
-        # Assuming the API returns images as base64-encoded strings
-        image_data = data['images'][0]
-        image_bytes = base64.b64decode(image_data)
-        with open(output_path, "wb") as f:
-            f.write(image_bytes)
-        logging.info(f"Image generated and saved to {output_path}.")
+        started = time.perf_counter()
+        if buffer is None:
+            _render_to_files(payload, config, [output_path])
+        else:
+            _render_to_files(payload, config, [buffer])
+            _save_buffer(buffer, output_path)
+        if cache:
+            cache.put_file(cache_key, output_path, prompt=payload["prompt"])
+        logging.info(f"Image generated and saved to {output_path} in {time.perf_counter() - started:.2f}s.")
         return True
     except Exception as e:
         logging.error(f"Failed to generate image for prompt '{prompt}': {e}")
         return False
 
+def render_image(prompt, config, model=None, lora=None, style=None, seed=None):
+    """
+    Renders one image and returns it decoded in memory, without writing an intermediate file.
+
+    The base64 payload is streamed into an in-memory buffer that Pillow opens directly,
+    so the image can go straight to enhance_image().
+
+    Returns:
+        PIL.Image.Image: The rendered image, or None on failure.
+    """
+    try:
+        payload = build_payload(prompt, config, model=model, lora=lora, style=style, seed=seed)
+        cache = get_image_cache(config) if is_cacheable(payload) else None
+        cache_key = make_image_key(payload) if cache else None
+        cached_path = cache.get(cache_key) if cache else None
+        if cached_path:
+            logging.info(f"Image cache hit ({cache_key[:12]}).")
+            with Image.open(cached_path) as image:
+                image.load()
+                return image
+
+        logging.info(f"Sending request to Stable Diffusion API with prompt: {prompt}")
+        started = time.perf_counter()
+        buffer = io.BytesIO()
+        _render_to_files(payload, config, [buffer])
+        if cache:
+            cache.put(cache_key, buffer.getbuffer(), prompt=payload["prompt"])
+        buffer.seek(0)
+        image = Image.open(buffer)
+        image.load()
+        logging.info(f"Image generated in memory in {time.perf_counter() - started:.2f}s.")
+        return image
+    except Exception as e:
+        logging.error(f"Failed to generate image for prompt '{prompt}': {e}")
+        return None
+
+def generate_image_batch(prompt, config, output_paths, model=None, lora=None, style=None, seed=None, buffers=None):
+    """
+    Renders several candidates of one prompt with a single txt2img request.
+
+    Uses `batch_size` so the SD server renders all candidates in one pass; with a fixed
+    seed the WebUI gives image i the seed `seed + i`. `buffers` (one per output) also
+    receive the encoded images, as for generate_image().
+
+    Returns:
+        list: The output paths that were written, in order (empty on failure).
+    """
+    try:
+        payload = build_payload(prompt, config, model=model, lora=lora, style=style, seed=seed)
+        payload["batch_size"] = len(output_paths)
+
+        cache = get_image_cache(config) if is_cacheable(payload) else None
+        cache_keys = [make_image_key({**payload, "batch_index": i}) for i in range(len(output_paths))] if cache else []
+        # Probe first, so a partly cached batch counts as misses only and each image is counted once
+        cached = bool(cache) and all(cache.contains(key) for key in cache_keys)
+        if cached and all(cache.fetch(key, output_path) for key, output_path in zip(cache_keys, output_paths)):
+            logging.info(f"Image cache hit for a batch of {len(output_paths)} images.")
+            return list(output_paths)
+        if cache and not cached:
+            cache.record_misses(len(cache_keys))
+
+        logging.info(f"Sending batched request ({len(output_paths)} images) to Stable Diffusion API with prompt: {prompt}")
+        started = time.perf_counter()
+        if buffers is None:
+            written = _render_to_files(payload, config, output_paths)
+        else:
+            streamed = _render_to_files(payload, config, buffers)
+            written = [output_path for output_path, buffer in zip(output_paths, buffers) if buffer in streamed]
+            for output_path, buffer in zip(written, streamed):
+                _save_buffer(buffer, output_path)
+        if cache:
+            for key, output_path in zip(cache_keys, written):
+                cache.put_file(key, output_path, prompt=payload["prompt"])
+        logging.info(f"Batch of {len(written)} images generated and saved in {time.perf_counter() - started:.2f}s.")
+        return written
+    except Exception as e:
+        logging.error(f"Failed to generate image batch for prompt '{prompt}': {e}")
+        return []
+
+@traced("generate_images", hot=True)
+def generate_images(prompts, config, output_paths, model=None, lora=None, style=None, seed=None, on_result=None, images=None):
+    """
+    Renders one image per prompt, amortizing requests across scenes that share a payload.
+
+    Scenes are grouped by their full txt2img payload and the groups are rendered back to
+    back by model, LoRA and size. Within a group, a fixed-seed payload is rendered once and
+    copied, while random-seed duplicates are rendered together as one `batch_size` request
+    of at most `sd_max_batch_size` images. AUTOMATIC1111 takes a single prompt string per
+    txt2img call, so distinct prompts still need one request each. Requests run in parallel
+    up to the combined capacity of the configured SD endpoints, so the scenes of one video
+    are spread across every node. `on_result(idx, success)` is called as soon as each image
+    is finished (from a worker thread when rendering in parallel), e.g., to checkpoint it.
+    With an `images` dict, the encoded bytes of every fresh render are kept in it by prompt
+    index, so enhancement can start from memory instead of reading the files back.
+
+    Returns:
+        list: One bool per prompt indicating success.
+    """
+    results = [False] * len(prompts)
+    max_batch = max(1, int(config.get('sd_max_batch_size', 4)))
+    groups = {}
+    for idx, prompt in enumerate(prompts):
+        payload = build_payload(prompt, config, model=model, lora=lora, style=style, seed=seed)
+        groups.setdefault(make_image_key(payload), (payload, []))[1].append(idx)
+
+    ordered = sorted(
+        groups.values(),
+        key=lambda group: (str(group[0].get("model", "")), str(group[0].get("lora", "")), group[0]["width"], group[0]["height"])
+    )
+    # One task per request: (scene indices, rendered as one batch_size request)
+    tasks = []
+    for payload, indices in ordered:
+        if len(indices) == 1 or is_cacheable(payload):
+            tasks.append((indices, False))
+        else:
+            tasks += [(indices[start:start + max_batch], True) for start in range(0, len(indices), max_batch)]
+
+    def render(task):
+        indices, batched = task
+        prompt = prompts[indices[0]]
+        buffers = {idx: io.BytesIO() for idx in indices} if images is not None else None
+        if batched:
+            written = generate_image_batch(
+                prompt, config, [output_paths[idx] for idx in indices], model=model, lora=lora, style=style, seed=seed,
+                buffers=[buffers[idx] for idx in indices] if buffers else None
+            )
+            for idx in indices:
+                results[idx] = output_paths[idx] in written
+        else:
+            first = indices[0]
+            results[first] = generate_image(
+                prompt, config, output_paths[first], model=model, lora=lora, style=style, seed=seed,
+                buffer=buffers[first] if buffers else None
+            )
+            for idx in indices[1:]:
+                if results[first]:
+                    shutil.copyfile(output_paths[first], output_paths[idx])
+                    results[idx] = True
+                    if buffers:
+                        buffers[idx] = buffers[first]
+        if buffers:
+            for idx in indices:
+                if results[idx] and buffers[idx].getbuffer().nbytes:
+                    images[idx] = buffers[idx].getvalue()
+        if on_result:
+            for idx in indices:
+                on_result(idx, results[idx])
+
+    workers = min(len(tasks), get_sd_client(config).capacity)
+    if workers <= 1:
+        for task in tasks:
+            render(task)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sd") as executor:
+            list(executor.map(render, tasks))
+    return results
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) != 6:
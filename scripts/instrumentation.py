@@ -0,0 +1,329 @@
+# scripts/instrumentation.py
+
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+
+try:
+    import psutil  # Optional: I/O counters and peak memory on every platform
+except ImportError:
+    psutil = None
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+def _peak_rss_mb():
+    """Peak resident memory of this process so far, in MB (None if it cannot be read)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+    return None
+
+def _io_bytes():
+    """
+    Bytes this process has passed through read and write calls so far (files, pipes and
+    sockets, including page-cache hits), or (None, None) if not available.
+    """
+    if psutil is not None:
+        try:
+            counters = psutil.Process().io_counters()
+            return (getattr(counters, 'read_chars', counters.read_bytes),
+                    getattr(counters, 'write_chars', counters.write_bytes))
+        except (psutil.Error, AttributeError):
+            pass
+    try:
+        with open('/proc/self/io', 'r') as f:
+            fields = dict(line.split(': ') for line in f.read().splitlines())
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+def _cpu_seconds():
+    """CPU time of this process (all threads) and of its finished child processes."""
+    times = os.times()
+    return times.user + times.system, times.children_user + times.children_system
+
+def _delta(end, start):
+    return None if end is None or start is None else end - start
+
+def _accumulate(stages, record):
+    """Adds a stage record to the per-stage totals used by the summary table."""
+    totals = stages.setdefault(record["name"], {
+        "count": 0, "wall": 0.0, "cpu": 0.0, "peak_rss_mb": 0.0, "read_bytes": 0, "write_bytes": 0, "errors": 0,
+    })
+    totals["count"] += 1
+    totals["wall"] += record["wall"]
+    totals["cpu"] += record["cpu"] + record["cpu_children"]
+    totals["peak_rss_mb"] = max(totals["peak_rss_mb"], record["peak_rss_mb"] or 0.0)
+    totals["read_bytes"] += record["read_bytes"] or 0
+    totals["write_bytes"] += record["write_bytes"] or 0
+    totals["errors"] += record["error"] is not None
+
+def format_summary(stages, calls, elapsed, path):
+    """
+    Formats per-stage totals (see _accumulate) and external call latencies as a table,
+    slowest stage first.
+    """
+    lines = [f"Run profile ({elapsed:.2f}s total, trace: {path})"]
+    lines.append(f"  {'stage':<16} {'count':>5} {'wall s':>9} {'cpu s':>9} {'peak MB':>8} {'read MB':>8} {'write MB':>9}")
+    for name, totals in sorted(stages.items(), key=lambda item: -item[1]["wall"]):
+        failed = f"  ({totals['errors']} failed)" if totals["errors"] else ""
+        lines.append(
+            f"  {name:<16} {totals['count']:>5} {totals['wall']:9.2f} {totals['cpu']:9.2f} {totals['peak_rss_mb']:8.1f} "
+            f"{totals['read_bytes'] / 1e6:8.1f} {totals['write_bytes'] / 1e6:9.1f}{failed}"
+        )
+    if calls:
+        lines.append(f"  {'external call':<16} {'count':>5} {'total s':>9} {'mean s':>9} {'p95 s':>8} {'max s':>8}")
+        for kind, latencies in sorted(calls.items()):
+            latencies = sorted(latencies)
+            p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+            lines.append(
+                f"  {kind:<16} {len(latencies):>5} {sum(latencies):9.2f} {sum(latencies) / len(latencies):9.3f} "
+                f"{p95:8.3f} {latencies[-1]:8.3f}"
+            )
+    return "\n".join(lines)
+
+def summarize_trace(path):
+    """Rebuilds the summary table from a saved JSONL trace."""
+    stages, calls = {}, {}
+    first = last = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            first = record["time"] if first is None else first
+            last = record["time"]
+            if record["type"] == "stage":
+                _accumulate(stages, record)
+            elif record["type"] == "call":
+                calls.setdefault(record["kind"], []).append(record["latency"])
+    return format_summary(stages, calls, (last - first) if first is not None else 0.0, path)
+
+class Tracer:
+    """
+    Records per-stage resource usage and external call latency of one run as JSONL.
+
+    Every finished stage appends a line with its wall time, CPU time (this process plus
+    child processes such as ffmpeg and the enhancement pool, once they have exited),
+    peak RSS and the bytes read and written while it ran. Every LLM, Stable Diffusion or
+    ffmpeg call appends a line with its latency. CPU, memory and I/O are process-wide
+    counters, so stages running concurrently on other threads are included in each other's
+    figures. Safe to use from several threads.
+
+    Args:
+        path (str): JSONL file the trace is appended to.
+        profile (bool): Run cProfile around stages marked hot (see `stage`). Only one hot
+            stage is profiled at a time; hot stages nested in it or running concurrently on
+            other threads are not profiled.
+    """
+
+    def __init__(self, path, profile=False):
+        self.path = path
+        self.profile = profile
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stages = {}
+        self._calls = {}
+        self._profiles = []
+        self._profiling = threading.Lock()  # Held while a profiler is active (one per process on 3.12+)
+        self.started = time.perf_counter()
+        self._write({"type": "run", "pid": os.getpid(), "argv": sys.argv, "psutil": psutil is not None})
+
+    def _write(self, record):
+        record["time"] = time.time()
+        line = json.dumps(record, default=str)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+                self._file.flush()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, name, hot=False, **fields):
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        stack.append(name)
+        profiler = None
+        if hot and self.profile and self._profiling.acquire(blocking=False):
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:  # Another profiling tool is already active
+                logging.debug(f"Not profiling stage '{name}': {e}")
+                self._profiling.release()
+                profiler = None
+        cpu_start, children_start = _cpu_seconds()
+        read_start, write_start = _io_bytes()
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            wall = time.perf_counter() - started
+            cpu_end, children_end = _cpu_seconds()
+            read_end, write_end = _io_bytes()
+            if profiler:
+                profiler.disable()
+                self._profiling.release()
+                with self._lock:
+                    self._profiles.append(profiler)
+            stack.pop()
+            record = {
+                "type": "stage",
+                "name": name,
+                "parent": parent,
+                "thread": threading.current_thread().name,
+                "wall": round(wall, 6),
+                "cpu": round(cpu_end - cpu_start, 6),
+                "cpu_children": round(children_end - children_start, 6),
+                "peak_rss_mb": _peak_rss_mb(),
+                "read_bytes": _delta(read_end, read_start),
+                "write_bytes": _delta(write_end, write_start),
+                "error": error,
+                **fields,
+            }
+            self._write(record)
+            with self._lock:
+                _accumulate(self._stages, record)
+
+    @contextmanager
+    def external_call(self, kind, **fields):
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            latency = time.perf_counter() - started
+            stack = self._stack()
+            self._write({
+                "type": "call",
+                "kind": kind,
+                "stage": stack[-1] if stack else None,
+                "thread": threading.current_thread().name,
+                "latency": round(latency, 6),
+                "error": error,
+                **fields,
+            })
+            with self._lock:
+                self._calls.setdefault(kind, []).append(latency)
+
+    def summary(self):
+        """Returns the summary table of stages and external calls as text."""
+        with self._lock:
+            stages = {name: dict(totals) for name, totals in self._stages.items()}
+            calls = {kind: list(latencies) for kind, latencies in self._calls.items()}
+        return format_summary(stages, calls, time.perf_counter() - self.started, self.path)
+
+    def close(self, print_summary=True, top=25):
+        """Writes the summary record, prints the table and the cProfile report (if any)."""
+        if self._file.closed:
+            return
+        with self._lock:
+            stages = {name: dict(totals) for name, totals in self._stages.items()}
+            calls = {kind: len(latencies) for kind, latencies in self._calls.items()}
+        self._write({"type": "summary", "stages": stages, "calls": calls})
+        with self._lock:
+            self._file.close()
+        if print_summary:
+            print("\n" + self.summary())
+        if self._profiles:
+            import pstats
+            profile_path = os.path.splitext(self.path)[0] + ".prof"
+            stats = pstats.Stats(*self._profiles)
+            stats.dump_stats(profile_path)
+            print(f"\ncProfile of the hot stages (saved to {profile_path}):")
+            stats.sort_stats("cumulative").print_stats(top)
+
+_tracer = None
+
+def start_trace(config, name="run", profile=False):
+    """
+    Starts the process-wide trace, written to `<trace_dir>/<name>_<timestamp>.jsonl`.
+
+    Returns the Tracer, or None if `trace_enabled` is false and profiling was not
+    requested. The summary is printed when the process exits (see finish_trace).
+    """
+    global _tracer
+    if not config.get('trace_enabled', True) and not profile:
+        return None
+    trace_dir = config.get('trace_dir', os.path.join("outputs", "traces"))
+    path = os.path.join(trace_dir, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.jsonl")
+    try:
+        _tracer = Tracer(path, profile=profile)
+    except OSError as e:
+        logging.error(f"Could not start the run trace at {path}: {e}")
+        return None
+    atexit.register(finish_trace)
+    logging.info(f"Tracing this run to {path}{' with cProfile' if profile else ''}.")
+    return _tracer
+
+def finish_trace(print_summary=True):
+    """Closes the trace started by start_trace and prints its summary."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer:
+        tracer.close(print_summary=print_summary)
+
+@contextmanager
+def stage(name, hot=False, **fields):
+    """
+    Measures a pipeline stage (a no-op when no trace is running). `hot` stages are
+    profiled with cProfile when the run was started with profiling; extra keyword
+    fields are written to the trace line.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield
+        return
+    with tracer.stage(name, hot=hot, **fields):
+        yield
+
+@contextmanager
+def external_call(kind, **fields):
+    """Measures the latency of one call to an external service ('llm', 'sd' or 'ffmpeg')."""
+    tracer = _tracer
+    if tracer is None:
+        yield
+        return
+    with tracer.external_call(kind, **fields):
+        yield
+
+def traced(name, hot=False):
+    """Decorator form of stage()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name, hot=hot):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python instrumentation.py <trace.jsonl>")
+        sys.exit(1)
+    print(summarize_trace(sys.argv[1]))
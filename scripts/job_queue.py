@@ -0,0 +1,656 @@
+# scripts/job_queue.py
+
+import os
+import re
+import time
+import socket
+import sqlite3
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+
+try:
+    from scripts.image_generator import generate_images
+    from scripts.image_editor import enhance_image, get_enhancement_settings, get_compress_level
+    from scripts.video_assembler import assemble_video
+    from scripts.scene_timing import plan_scene_durations
+    from scripts.run_manifest import (
+        open_run, resume_script, resume_prompts, resume_scenes, video_signature, file_sha256, fingerprint
+    )
+    from scripts.instrumentation import stage as traced_stage
+    from scripts.sd_client import get_sd_client
+except ImportError:
+    from image_generator import generate_images
+    from image_editor import enhance_image, get_enhancement_settings, get_compress_level
+    from video_assembler import assemble_video
+    from scene_timing import plan_scene_durations
+    from run_manifest import (
+        open_run, resume_script, resume_prompts, resume_scenes, video_signature, file_sha256, fingerprint
+    )
+    from instrumentation import stage as traced_stage
+    from sd_client import get_sd_client
+
+STAGES = ("script", "prompts", "images", "enhance", "video")
+
+# Defaults for the `job_queue` config section
+DEFAULT_JOB_QUEUE = {
+    "path": os.path.join("outputs", "jobs.sqlite"),
+    "workers": 2,  # Jobs processed at the same time
+    "gpu_slots": 1,  # Jobs allowed to render on Stable Diffusion at the same time
+    "max_checkpoint_run": 0,  # Jobs in a row one checkpoint may render while others wait (0: no limit)
+    "max_attempts": 3,  # Jobs interrupted (or failing) this many times are marked failed
+    "heartbeat_seconds": 15.0,  # How often a scheduler marks the jobs it runs as alive
+    "stale_seconds": 120.0,  # Running jobs without a heartbeat for this long are requeued by other processes
+    "poll_seconds": 2.0,  # How often idle workers look for new jobs in watch mode
+}
+
+def get_job_queue_settings(config):
+    """Returns the `job_queue` config section filled in with DEFAULT_JOB_QUEUE."""
+    return {**DEFAULT_JOB_QUEUE, **(config.get('job_queue') or {})}
+
+def _content_key(story_path, audio_path):
+    """Identifies the story text and audio file of a job, or returns None if either cannot be read."""
+    try:
+        audio_stat = os.stat(audio_path)
+        return fingerprint([file_sha256(story_path), audio_stat.st_size, audio_stat.st_mtime])
+    except OSError:
+        return None
+
+def _process_alive(pid):
+    """Returns whether process `pid` on this host is running (True when it cannot be told)."""
+    try:
+        import psutil
+        return psutil.pid_exists(pid)
+    except ImportError:
+        pass
+    if os.name == "nt":
+        return True  # os.kill would terminate the process; rely on the heartbeat instead
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Exists but belongs to another user
+    return True
+
+class JobQueue:
+    """
+    Persistent queue of story-to-video jobs stored in a single SQLite file.
+
+    Jobs move from 'pending' to 'running' when a worker claims them and end as 'done' or
+    'failed'. A claimed job records its owner (host:pid) and a heartbeat, so another
+    process only takes over running jobs whose owner is gone. Every finished stage is
+    recorded with its duration, so throughput survives restarts. Safe to share between
+    threads and processes.
+
+    Args:
+        path (str): Path of the SQLite database (e.g., 'outputs/jobs.sqlite').
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, story_path TEXT, audio_path TEXT, model TEXT, lora TEXT, "
+            "style TEXT, status TEXT, stage TEXT, output_path TEXT, error TEXT, attempts INTEGER DEFAULT 0, "
+            "created REAL, started REAL, finished REAL, owner TEXT, heartbeat REAL, content TEXT)"
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("heartbeat", "REAL"), ("content", "TEXT")):
+            if column not in columns:  # Databases created before jobs had owners and content keys
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS stage_runs ("
+            "job_id INTEGER, stage TEXT, seconds REAL, items INTEGER, finished REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS model_swaps ("
+            "endpoint TEXT, from_model TEXT, to_model TEXT, seconds REAL, finished REAL)"
+        )
+        self._conn.commit()
+
+    def add(self, story_path, audio_path, model=None, lora=None, style=None):
+        """
+        Queues a job and returns (job_id, queued).
+
+        A job with the same story, audio, model, LoRA and style that is pending, or that is
+        running or done with the same story text and audio file, is not queued again: its id
+        is returned with `queued` False. A failed one, or a done one whose story or audio has
+        changed since, is requeued, so rerunning a batch only adds what is missing or stale.
+        """
+        content = _content_key(story_path, audio_path)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, status, content FROM jobs WHERE story_path = ? AND audio_path = ? AND model IS ? "
+                "AND lora IS ? AND style IS ? ORDER BY id DESC",
+                (story_path, audio_path, model, lora, style)
+            ).fetchall()
+            for row in rows:
+                if row["status"] == "pending" or (row["status"] in ("running", "done") and row["content"] == content):
+                    if row["content"] != content:
+                        self._conn.execute("UPDATE jobs SET content = ? WHERE id = ?", (content, row["id"]))
+                        self._conn.commit()
+                    return row["id"], False
+            row = next((row for row in rows if row["status"] != "running"), None)
+            if row:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'pending', stage = NULL, attempts = 0, error = NULL, content = ? WHERE id = ?",
+                    (content, row["id"])
+                )
+                job_id = row["id"]
+            else:
+                job_id = self._conn.execute(
+                    "INSERT INTO jobs (story_path, audio_path, model, lora, style, status, created, content) "
+                    "VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)",
+                    (story_path, audio_path, model, lora, style, time.time(), content)
+                ).lastrowid
+            self._conn.commit()
+            return job_id, True
+
+    def claim(self, prefer_model=None):
+        """
+        Marks the oldest pending job as running (owned by this process) and returns it as a
+        dict, or None if there is none. With `prefer_model`, the oldest pending job for that
+        checkpoint goes first.
+        """
+        order = "model IS NOT ?, id" if prefer_model else "id"
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status = 'pending' ORDER BY {order} LIMIT 1", (prefer_model,) if prefer_model else ()
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', stage = NULL, attempts = attempts + 1, started = ?, error = NULL, "
+                "owner = ?, heartbeat = ? WHERE id = ?",
+                (now, self.owner, now, row["id"])
+            )
+            self._conn.commit()
+            job = dict(row)
+            job["attempts"] += 1
+            return job
+
+    def heartbeat(self):
+        """Marks the jobs this process is running as alive."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE status = 'running' AND owner = ?", (time.time(), self.owner)
+            )
+            self._conn.commit()
+
+    def set_stage(self, job_id, stage):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET stage = ? WHERE id = ?", (stage, job_id))
+            self._conn.commit()
+
+    def record_stage(self, job_id, stage, seconds, items=1):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO stage_runs (job_id, stage, seconds, items, finished) VALUES (?, ?, ?, ?, ?)",
+                (job_id, stage, seconds, items, time.time())
+            )
+            self._conn.commit()
+
+    def record_swap(self, endpoint, from_model, to_model, seconds, finished=None):
+        """Records one checkpoint swap on a Stable Diffusion endpoint."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO model_swaps (endpoint, from_model, to_model, seconds, finished) VALUES (?, ?, ?, ?, ?)",
+                (endpoint, from_model, to_model, seconds, finished or time.time())
+            )
+            self._conn.commit()
+
+    def swap_stats(self, since=None):
+        """Returns {'swaps', 'seconds'}: checkpoint swaps recorded (optionally after `since`) and their total time."""
+        with self._lock:
+            swaps, seconds = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(seconds), 0) FROM model_swaps WHERE finished >= ?", (since or 0,)
+            ).fetchone()
+        return {"swaps": swaps, "seconds": seconds}
+
+    def complete(self, job_id, output_path):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', stage = NULL, output_path = ?, finished = ? WHERE id = ?",
+                (output_path, time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def fail(self, job_id, error, max_attempts=1):
+        """Records a failure; the job is retried (back to pending) until it has used `max_attempts`."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, finished = ? WHERE id = ?",
+                (max_attempts, str(error), time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def recover(self, max_attempts, stale_seconds=DEFAULT_JOB_QUEUE["stale_seconds"]):
+        """
+        Requeues jobs left 'running' by a process that stopped (crash, restart) so they run
+        again, unless they have already used `max_attempts`. A job counts as abandoned when
+        its owner is a process on this host that no longer exists, or when its heartbeat is
+        older than `stale_seconds`; jobs of live schedulers elsewhere are left alone.
+        Returns the number requeued.
+        """
+        host = socket.gethostname()
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, attempts, owner, heartbeat FROM jobs WHERE status = 'running'"
+            ).fetchall()
+            abandoned = []
+            for row in rows:
+                owner_host, _, pid = (row["owner"] or "").rpartition(":")
+                if row["owner"] == self.owner:
+                    continue
+                if owner_host == host and pid.isdigit() and not _process_alive(int(pid)):
+                    abandoned.append(row)
+                elif now - (row["heartbeat"] or 0) > stale_seconds:
+                    abandoned.append(row)
+            for row in abandoned:
+                if row["attempts"] >= max_attempts:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = 'Interrupted too many times' WHERE id = ?", (row["id"],)
+                    )
+                else:
+                    self._conn.execute("UPDATE jobs SET status = 'pending', owner = NULL WHERE id = ?", (row["id"],))
+            self._conn.commit()
+        requeued = sum(1 for row in abandoned if row["attempts"] < max_attempts)
+        if requeued:
+            logging.info(f"Requeued {requeued} interrupted jobs.")
+        return requeued
+
+    def depth(self):
+        """Returns the number of jobs per status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def jobs(self, status=None, limit=50):
+        with self._lock:
+            if status:
+                rows = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit)
+                ).fetchall()
+            else:
+                rows = self._conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def stage_throughput(self, since=None):
+        """
+        Summarizes recorded stage runs (optionally only those finished after `since`).
+
+        Returns:
+            dict: stage -> {'runs', 'items', 'seconds', 'seconds_per_run', 'items_per_minute'},
+            where items_per_minute is measured over the busy time of that stage.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage, COUNT(*), COALESCE(SUM(items), 0), COALESCE(SUM(seconds), 0) FROM stage_runs "
+                "WHERE finished >= ? GROUP BY stage",
+                (since or 0,)
+            ).fetchall()
+        summary = {}
+        for stage, runs, items, seconds in rows:
+            summary[stage] = {
+                "runs": runs,
+                "items": items,
+                "seconds": seconds,
+                "seconds_per_run": seconds / runs if runs else 0.0,
+                "items_per_minute": items * 60 / seconds if seconds else 0.0,
+            }
+        return summary
+
+    def log_stats(self, since=None):
+        depth = self.depth()
+        logging.info(
+            f"Job queue: {depth['pending']} pending, {depth['running']} running, "
+            f"{depth['done']} done, {depth['failed']} failed."
+        )
+        for stage in STAGES:
+            stats = self.stage_throughput(since).get(stage)
+            if stats:
+                logging.info(
+                    f"Stage '{stage}': {stats['runs']} runs, {stats['seconds_per_run']:.2f}s per run, "
+                    f"{stats['items_per_minute']:.1f} items/min."
+                )
+        swaps = self.swap_stats(since)
+        logging.info(f"Checkpoint swaps: {swaps['swaps']} ({swaps['seconds']:.1f}s loading weights).")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class CheckpointGate:
+    """
+    GPU slots handed out by checkpoint instead of first come, first served.
+
+    When a slot frees up, a job for the checkpoint that was granted last (the one the
+    server has loaded) goes first; only when none waits does the gate move on, to the
+    checkpoint with the most waiting jobs (the longest waiting job breaking ties). Jobs
+    queued for the GPU are thereby rendered checkpoint by checkpoint. `max_group_run`
+    bounds how many jobs in a row one checkpoint may take while others wait (0: no limit).
+
+    Args:
+        slots (int): Jobs allowed to render at the same time.
+        max_group_run (int): Consecutive grants for one checkpoint while others wait.
+    """
+
+    def __init__(self, slots, max_group_run=0):
+        self.slots = slots
+        self.max_group_run = max(0, int(max_group_run))
+        self.current = None  # Checkpoint of the most recent grant
+        self.switches = 0
+        self._in_use = 0
+        self._run = 0  # Grants for `current` since it was switched to
+        self._waiting = []  # (ticket, model), oldest first
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+
+    def _next(self):
+        same = [waiter for waiter in self._waiting if waiter[1] == self.current]
+        others = len(same) < len(self._waiting)
+        if same and not (others and self.max_group_run and self._run >= self.max_group_run):
+            return same[0]
+        counts = {}
+        for _, model in self._waiting:
+            counts[model] = counts.get(model, 0) + 1
+        candidates = [waiter for waiter in self._waiting if waiter[1] != self.current] or self._waiting
+        return min(candidates, key=lambda waiter: (-counts[waiter[1]], waiter[0]))
+
+    @contextmanager
+    def slot(self, model):
+        """Holds a GPU slot for a job rendering with checkpoint `model`."""
+        with self._condition:
+            waiter = (next(self._tickets), model)
+            self._waiting.append(waiter)
+            try:
+                while self._in_use >= self.slots or self._next() is not waiter:
+                    self._condition.wait()
+            finally:
+                self._waiting.remove(waiter)
+            self._in_use += 1
+            if model != self.current:
+                if self.current is not None:
+                    self.switches += 1
+                self.current = model
+                self._run = 0
+            self._run += 1
+            self._condition.notify_all()  # With free slots left, the next waiter may go too
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_use -= 1
+                self._condition.notify_all()
+
+class Scheduler:
+    """
+    Runs queued jobs on `workers` threads through the existing stage functions,
+    checkpointing each job so a retried job resumes where it stopped.
+
+    Stable Diffusion rendering is guarded by a CheckpointGate with `gpu_slots` slots, so the
+    GPU renders one job's images at a time while other workers run the LLM, enhancement
+    and encoding stages of their own jobs. With more workers than GPU slots, the next job
+    is usually waiting for the GPU the moment the previous one releases it. Jobs waiting
+    for the GPU, and pending jobs being claimed, go checkpoint by checkpoint, so the SD
+    server swaps weights as rarely as possible; swaps are saved to the queue database.
+
+    Args:
+        job_queue (JobQueue): Queue to take jobs from.
+        config (dict): Loaded configuration; `job_queue` supplies the defaults below.
+        workers (int, optional): Concurrent jobs.
+        gpu_slots (int, optional): Concurrent Stable Diffusion renders.
+        output_dir (str, optional): Directory for videos (default: outputs/videos).
+        image_root (str, optional): Directory for per-job image folders (default: outputs/images).
+    """
+
+    def __init__(self, job_queue, config, workers=None, gpu_slots=None, output_dir=None, image_root=None):
+        settings = get_job_queue_settings(config)
+        self.queue = job_queue
+        self.config = config
+        self.workers = max(1, int(workers or settings["workers"]))
+        self.gpu_slots = max(1, int(gpu_slots or settings["gpu_slots"]))
+        self.max_attempts = max(1, int(settings["max_attempts"]))
+        self.heartbeat_seconds = max(0.1, float(settings["heartbeat_seconds"]))
+        self.stale_seconds = float(settings["stale_seconds"])
+        self.poll_seconds = float(settings["poll_seconds"])
+        self.output_dir = output_dir or os.path.join("outputs", "videos")
+        self.image_root = image_root or os.path.join("outputs", "images")
+        self.gpu = CheckpointGate(self.gpu_slots, settings["max_checkpoint_run"])
+        self.gpu_busy_seconds = 0.0
+        self._stats_lock = threading.Lock()
+        self._swaps_saved = len(get_sd_client(config).swap_history())
+        self._stop = threading.Event()
+
+    def _timed(self, job_id, stage, func, items=1):
+        self.queue.set_stage(job_id, stage)
+        started = time.perf_counter()
+        with traced_stage(stage, job=job_id):
+            result = func()
+        elapsed = time.perf_counter() - started
+        count = items(result) if callable(items) else items
+        self.queue.record_stage(job_id, stage, elapsed, count)
+        return result
+
+    def _render_images(self, job, prompts, config, output_paths, **kwargs):
+        # Same signature as generate_images, so resume_scenes can render through the GPU slot
+        self.queue.set_stage(job["id"], "gpu_wait")
+        with self.gpu.slot(job["model"]):
+            # Timed only while holding the GPU, so the stage throughput excludes queueing
+            self.queue.set_stage(job["id"], "images")
+            started = time.perf_counter()
+            try:
+                with traced_stage("images", job=job["id"]):
+                    results = generate_images(prompts, config, output_paths, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._stats_lock:
+                    self.gpu_busy_seconds += elapsed
+        self.queue.record_stage(job["id"], "images", elapsed, sum(results))
+        self._save_swaps()
+        return results
+
+    def _save_swaps(self):
+        # Moves the checkpoint swaps made since the last call into the queue database
+        with self._stats_lock:
+            swaps = get_sd_client(self.config).swap_history(self._swaps_saved)
+            self._swaps_saved += len(swaps)
+        for swap in swaps:
+            self.queue.record_swap(swap["endpoint"], swap["from_model"], swap["to_model"], swap["seconds"], swap["time"])
+
+    def _enhance(self, job, sources, output_paths):
+        brightness, contrast = get_enhancement_settings(self.config)
+        compress_level = get_compress_level(self.config)
+        return self._timed(job["id"], "enhance", lambda: [
+            enhance_image(source, output, brightness, contrast, compress_level) for source, output in zip(sources, output_paths)
+        ], items=len)
+
+    def _assemble(self, job, manifest, scenes, key_points, output_path):
+        image_paths = [path for _, path in scenes]
+        durations = None
+        if self.config.get('scene_timing', 'uniform') == 'aligned':
+            scene_points = [key_points[idx] for idx, _ in scenes]
+            durations = plan_scene_durations(job["story_path"], job["audio_path"], scene_points, self.config)
+        signature = None
+        if manifest:
+            signature = video_signature(image_paths, job["audio_path"], self.config, durations)
+            existing = manifest.artifact("video", 0, signature)
+            if existing:
+                return existing
+        video = assemble_video(image_paths, job["audio_path"], output_path, self.config, durations=durations)
+        if video and manifest:
+            manifest.record_artifact("video", 0, video, signature)
+        return video
+
+    def run_job(self, job):
+        """
+        Runs every stage of one job. Returns the video path; raises on failure.
+
+        Each job checkpoints into a run manifest keyed on its story, audio and render
+        settings, so a job requeued after a crash or failure, or queued again by a later
+        batch, resumes from its first incomplete stage.
+        """
+        job_id = job["id"]
+        name = os.path.splitext(os.path.basename(job["story_path"]))[0]
+        slug = re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('_') or "story"
+        manifest = open_run(
+            self.config, job["story_path"], key=[job["audio_path"], job["model"], job["lora"], job["style"]]
+        )
+        image_dir = manifest.image_dir if manifest else os.path.join(self.image_root, f"job_{job_id}")
+        os.makedirs(self.output_dir, exist_ok=True)
+        output_path = os.path.join(self.output_dir, f"{slug}_job{job_id}.mp4")
+
+        key_points, _ = self._timed(job_id, "script", lambda: resume_script(manifest, job["story_path"], self.config))
+        if not key_points:
+            raise RuntimeError("No key points extracted from the script.")
+        prompts = self._timed(job_id, "prompts", lambda: resume_prompts(manifest, key_points, self.config), items=len)
+        if not prompts:
+            raise RuntimeError("No prompts were generated.")
+        scenes = resume_scenes(
+            manifest, prompts, self.config, image_dir,
+            enhance=lambda sources, outputs: self._enhance(job, sources, outputs),
+            model=job["model"], lora=job["lora"], style=job["style"],
+            render=lambda *args, **kwargs: self._render_images(job, *args, **kwargs)
+        )
+        if not scenes:
+            raise RuntimeError("No images were generated.")
+        video = self._timed(job_id, "video", lambda: self._assemble(job, manifest, scenes, key_points, output_path))
+        if not video:
+            raise RuntimeError("Video assembly failed.")
+        return video
+
+    def _heartbeat(self, finished):
+        # Keeps this process's running jobs from being taken over by another scheduler
+        while not finished.wait(self.heartbeat_seconds):
+            try:
+                self.queue.heartbeat()
+            except sqlite3.Error as e:
+                logging.warning(f"Could not update job heartbeat: {e}")
+
+    def _work(self, watch):
+        while not self._stop.is_set():
+            job = self.queue.claim(prefer_model=self.gpu.current)
+            if job is None:
+                if not watch:
+                    break
+                if self.queue.recover(self.max_attempts, self.stale_seconds):
+                    continue  # Took over jobs of a scheduler that stopped
+                self._stop.wait(self.poll_seconds)
+                continue
+            logging.info(f"Worker {threading.current_thread().name} started job {job['id']} ({job['story_path']}).")
+            try:
+                video = self.run_job(job)
+                self.queue.complete(job["id"], video)
+                logging.info(f"Job {job['id']} finished: {video}")
+            except Exception as e:
+                logging.error(f"Job {job['id']} failed (attempt {job['attempts']}): {e}")
+                self.queue.fail(job["id"], e, self.max_attempts)
+
+    def run(self, watch=False):
+        """
+        Processes jobs until the queue is empty (or, with `watch`, until stop() is called).
+        Jobs left running by a process that stopped are requeued first; jobs owned by
+        schedulers still running elsewhere are not touched.
+
+        Returns:
+            dict: Queue depth when the run ended.
+        """
+        self.queue.recover(self.max_attempts, self.stale_seconds)
+        started_at = time.time()
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._work, args=(watch,), name=f"job-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        finished = threading.Event()
+        threads.append(threading.Thread(target=self._heartbeat, args=(finished,), name="job-heartbeat", daemon=True))
+        logging.info(f"Scheduler started: {self.workers} workers, {self.gpu_slots} GPU slots, queue {self.queue.depth()}.")
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads[:-1]:
+                while thread.is_alive():
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            # Running jobs stay 'running' and are requeued by recover() on the next start
+            logging.warning("Scheduler interrupted; unfinished jobs will be requeued on restart.")
+            self._stop.set()
+            raise
+        finally:
+            finished.set()
+        elapsed = time.perf_counter() - started
+        self.queue.log_stats(since=started_at)
+        logging.info(
+            f"Scheduler finished in {elapsed:.2f}s; GPU stage busy {self.gpu_busy_seconds:.2f}s "
+            f"({100 * self.gpu_busy_seconds / max(elapsed * self.gpu_slots, 1e-9):.0f}% of GPU slot time), "
+            f"{self.gpu.switches} checkpoint changes between jobs."
+        )
+        return self.queue.depth()
+
+    def stop(self):
+        self._stop.set()
+
+if __name__ == "__main__":
+    import argparse
+    import yaml
+    parser = argparse.ArgumentParser(description="Queue story-to-video jobs and run them with a worker pool.")
+    parser.add_argument("--config", default=os.path.join("config", "config.yaml"))
+    parser.add_argument("--db", help="Job database (default: job_queue.path from the config)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_parser = subparsers.add_parser("add", help="Queue a story/audio pair")
+    add_parser.add_argument("story_path")
+    add_parser.add_argument("audio_path")
+    add_parser.add_argument("--model")
+    add_parser.add_argument("--lora")
+    add_parser.add_argument("--style")
+    run_parser = subparsers.add_parser("run", help="Process queued jobs")
+    run_parser.add_argument("--workers", type=int)
+    run_parser.add_argument("--gpu-slots", type=int)
+    run_parser.add_argument("--watch", action="store_true", help="Keep waiting for new jobs instead of exiting when idle")
+    list_parser = subparsers.add_parser("list", help="List jobs, newest first")
+    list_parser.add_argument("--status", choices=["pending", "running", "done", "failed"])
+    list_parser.add_argument("--limit", type=int, default=20)
+    subparsers.add_parser("stats", help="Show queue depth and per-stage throughput")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+    job_queue = JobQueue(args.db or get_job_queue_settings(config)["path"])
+    if args.command == "add":
+        job_id, queued = job_queue.add(
+            args.story_path, args.audio_path,
+            model=args.model or config.get('sd_model'), lora=args.lora or config.get('lora_model'),
+            style=args.style or config.get('default_style', 'comics')
+        )
+        print(f"Queued job {job_id}." if queued else f"Job {job_id} is already queued or done.")
+    elif args.command == "run":
+        depth = Scheduler(job_queue, config, workers=args.workers, gpu_slots=args.gpu_slots).run(watch=args.watch)
+        print(f"Done: {depth['done']}, failed: {depth['failed']}, pending: {depth['pending']}")
+    elif args.command == "list":
+        for job in job_queue.jobs(args.status, args.limit):
+            print(f"{job['id']:5}  {job['status']:<8} {job['stage'] or '':<8} {os.path.basename(job['story_path'])}  "
+                  f"{job['output_path'] or job['error'] or ''}")
+    elif args.command == "stats":
+        depth = job_queue.depth()
+        print(f"Queue: {depth['pending']} pending, {depth['running']} running, {depth['done']} done, {depth['failed']} failed")
+        for stage, stats in job_queue.stage_throughput().items():
+            print(f"  {stage:<8} {stats['runs']:5} runs  {stats['seconds_per_run']:8.2f}s/run  "
+                  f"{stats['items_per_minute']:8.1f} items/min")
+        swaps = job_queue.swap_stats()
+        print(f"Checkpoint swaps: {swaps['swaps']} ({swaps['seconds']:.1f}s loading weights)")
@@ -0,0 +1,177 @@
+# scripts/llm_client.py
+
+import os
+import json
+import logging
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from scripts.llm_cache import LLMCache, make_cache_key
+    from scripts.instrumentation import external_call
+except ImportError:
+    from llm_cache import LLMCache, make_cache_key
+    from instrumentation import external_call
+
+DEFAULT_LLM_MODEL = "hf.co/ArliAI/Mistral-Small-22B-ArliAI-RPMax-v1.1-GGUF:latest"
+
+class OllamaClient:
+    """
+    Client for Ollama's HTTP API (/api/generate).
+
+    One pooled requests.Session is kept for the lifetime of the client so every call
+    reuses an open keep-alive connection, and the model stays loaded on the server
+    between calls through the `keep_alive` request field.
+
+    Args:
+        api_url (str): Base URL of the Ollama server (e.g., 'http://localhost:11434').
+        model (str): Model name to run.
+        keep_alive (str): How long Ollama keeps the model in memory after a call (e.g., '30m').
+        timeout (float): Socket timeout in seconds for each request.
+        pool_size (int): Maximum number of pooled connections to the server.
+        options (dict, optional): Default generation options (temperature, num_ctx, ...).
+        cache (LLMCache, optional): Response cache consulted before calling the server.
+    """
+
+    def __init__(self, api_url, model=DEFAULT_LLM_MODEL, keep_alive="30m", timeout=300, pool_size=4, options=None, cache=None):
+        self.api_url = api_url.rstrip('/')
+        self.model = model
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.options = dict(options or {})
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def generate(self, prompt, options=None, timeout=None, format=None, validate=None):
+        """
+        Runs a single completion and returns the decoded text.
+
+        The response is streamed and decoded token by token, so nothing but the
+        generated text is returned (no console noise as with `ollama run`).
+        `timeout` bounds the whole request, not just each socket read. `format` is passed
+        through to Ollama ('json' or a JSON schema) to constrain the output. When the
+        client has a cache, identical requests are answered from it. `validate` is called
+        with the output before it is cached (and on cached answers): output it rejects is
+        returned to the caller but never cached, so an unusable answer is not replayed.
+
+        Raises:
+            requests.RequestException: On connection or HTTP errors.
+            RuntimeError: If Ollama reports an error in the stream.
+            TimeoutError: If the completion takes longer than `timeout`.
+        """
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": self.keep_alive,
+        }
+        if format:
+            payload["format"] = format
+        merged_options = {**self.options, **(options or {})}
+        if merged_options:
+            payload["options"] = merged_options
+        cache_key = None
+        if self.cache is not None:
+            cache_key = make_cache_key(self.model, prompt, {"options": merged_options, "format": format})
+            cached = self.cache.get(cache_key)
+            if cached is not None and (validate is None or validate(cached)):
+                logging.info(f"LLM cache hit ({cache_key[:12]}).")
+                return cached
+            if cached is not None:
+                logging.warning(f"Ignoring cached LLM response {cache_key[:12]} that failed validation.")
+        url = f"{self.api_url}/api/generate"
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        chunks = []
+        with external_call("llm", model=self.model), self.session.post(url, json=payload, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"LLM request exceeded {timeout} seconds.")
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(f"Ollama error: {data['error']}")
+                chunks.append(data.get("response", ""))
+                if data.get("done"):
+                    break
+        output = "".join(chunks).strip()
+        if cache_key and output and (validate is None or validate(output)):
+            self.cache.put(cache_key, self.model, output)
+        return output
+
+    def warm_up(self):
+        """
+        Asks Ollama to load the model now (a generate call without a prompt), so the first
+        real request does not pay the model load time. Returns True on success.
+        """
+        try:
+            with external_call("llm", model=self.model, request="warm_up"):
+                response = self.session.post(
+                    f"{self.api_url}/api/generate",
+                    json={"model": self.model, "keep_alive": self.keep_alive},
+                    timeout=self.timeout,
+                )
+                response.raise_for_status()
+            logging.info(f"LLM model '{self.model}' loaded (keep_alive {self.keep_alive}).")
+            return True
+        except Exception as e:
+            logging.warning(f"Could not preload LLM model '{self.model}': {e}")
+            return False
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_llm_client(config):
+    """
+    Returns the shared OllamaClient for the given config, creating it on first use.
+
+    Clients are cached per (api, model, keep_alive, cache settings) so script processing
+    and prompt generation reuse the same connection pool within a process. The response
+    cache is enabled unless `llm_cache_enabled` is false in the config.
+    """
+    api_url = config.get('ollama_api', 'http://localhost:11434')
+    model = config.get('llm_model', DEFAULT_LLM_MODEL)
+    keep_alive = config.get('llm_keep_alive', '30m')
+    cache_path = None
+    if config.get('llm_cache_enabled', True):
+        cache_path = config.get('llm_cache_path', os.path.join("outputs", "cache", "llm_cache.sqlite"))
+    key = (api_url, model, keep_alive, cache_path)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            cache = None
+            if cache_path:
+                max_bytes = int(config.get('llm_cache_max_mb', 256)) * 1024 * 1024
+                cache = LLMCache(cache_path, max_bytes=max_bytes)
+            client = OllamaClient(
+                api_url,
+                model=model,
+                keep_alive=keep_alive,
+                timeout=config.get('llm_timeout', 300),
+                pool_size=max(4, int(config.get('llm_concurrency', 1))),
+                options=config.get('llm_options'),
+                cache=cache,
+            )
+            _clients[key] = client
+            logging.info(f"Created Ollama client for model '{model}' at {api_url}.")
+        return client
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 3:
+        print("Usage: python llm_client.py <ollama_api> <prompt>")
+        sys.exit(1)
+    client = OllamaClient(sys.argv[1])
+    print(client.generate(sys.argv[2]))
@@ -0,0 +1,127 @@
+# scripts/media_probe.py
+
+import os
+import re
+import json
+import shutil
+import struct
+import logging
+import subprocess
+
+try:
+    from scripts.instrumentation import external_call
+except ImportError:
+    from instrumentation import external_call
+
+def probe_wav(path):
+    """
+    Reads the format of a WAV file from its RIFF header without touching the samples.
+
+    Returns:
+        dict: format_tag (1 = integer PCM, 3 = IEEE float), sample_rate, channels,
+        bits_per_sample, block_align, byte_rate, data_offset, data_size and duration (seconds).
+
+    Raises:
+        ValueError: If the file is not a PCM-style RIFF/WAVE file.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            raise ValueError(f"'{path}' is not a RIFF/WAVE file.")
+        fmt = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                break
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+            if chunk_id == b'fmt ':
+                data = f.read(chunk_size)
+                format_tag, channels, sample_rate, byte_rate, block_align, bits = struct.unpack('<HHIIHH', data[:16])
+                if format_tag == 0xFFFE and len(data) >= 26:
+                    # WAVE_FORMAT_EXTENSIBLE keeps the real format in the sub-format GUID
+                    format_tag = struct.unpack('<H', data[24:26])[0]
+                fmt = {
+                    "format_tag": format_tag,
+                    "sample_rate": sample_rate,
+                    "channels": channels,
+                    "bits_per_sample": bits,
+                    "block_align": block_align,
+                    "byte_rate": byte_rate,
+                }
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError(f"'{path}' has a data chunk before its fmt chunk.")
+                data_offset = f.tell()
+                # Streaming writers leave the size as 0 or 0xFFFFFFFF; fall back to the file size
+                available = os.path.getsize(path) - data_offset
+                data_size = chunk_size if 0 < chunk_size <= available else available
+                return {
+                    **fmt,
+                    "data_offset": data_offset,
+                    "data_size": data_size,
+                    "duration": data_size / fmt["byte_rate"],
+                }
+            else:
+                f.seek(chunk_size, os.SEEK_CUR)
+            if chunk_size % 2:
+                f.seek(1, os.SEEK_CUR)  # Chunks are word aligned
+    raise ValueError(f"'{path}' has no data chunk.")
+
+def find_ffprobe(config):
+    """Returns ffprobe next to the configured `ffmpeg_path`, or from PATH, or None."""
+    ffmpeg_path = (config or {}).get('ffmpeg_path')
+    if ffmpeg_path:
+        directory, name = os.path.split(ffmpeg_path)
+        candidate = os.path.join(directory, name.replace('ffmpeg', 'ffprobe'))
+        if candidate != ffmpeg_path and os.path.isfile(candidate):
+            return candidate
+    return shutil.which("ffprobe")
+
+def _ffprobe_duration(ffprobe_path, path):
+    with external_call("ffmpeg", engine="ffprobe"):
+        result = subprocess.run(
+            [ffprobe_path, "-v", "error", "-show_entries", "format=duration", "-of", "json", path],
+            capture_output=True, text=True, encoding='utf-8', errors='replace'
+        )
+    if result.returncode != 0:
+        raise ValueError(f"ffprobe failed for '{path}': {result.stderr.strip()}")
+    return float(json.loads(result.stdout)["format"]["duration"])
+
+def _ffmpeg_duration(ffmpeg_path, path):
+    # `ffmpeg -i` prints the container duration to stderr without decoding the stream
+    with external_call("ffmpeg", engine="probe"):
+        result = subprocess.run([ffmpeg_path, "-hide_banner", "-i", path], capture_output=True, text=True, encoding='utf-8', errors='replace')
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+    if not match:
+        raise ValueError(f"Could not read duration of '{path}'.")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def probe_duration(path, config=None):
+    """
+    Returns the duration of an audio file in seconds without decoding it.
+
+    WAV files are read from their header. Other formats (e.g., MP3) use the container
+    metadata via ffprobe, or `ffmpeg -i` when ffprobe is not available.
+    """
+    if os.path.splitext(path)[1].lower() == '.wav':
+        try:
+            return probe_wav(path)["duration"]
+        except ValueError as e:
+            logging.warning(f"WAV header probe failed, falling back to FFmpeg: {e}")
+    ffprobe_path = find_ffprobe(config)
+    if ffprobe_path:
+        return _ffprobe_duration(ffprobe_path, path)
+    ffmpeg_path = (config or {}).get('ffmpeg_path')
+    if not ffmpeg_path or not os.path.isfile(ffmpeg_path):
+        ffmpeg_path = shutil.which("ffmpeg")
+    if not ffmpeg_path:
+        raise FileNotFoundError("Neither ffprobe nor ffmpeg is available to probe the audio duration.")
+    return _ffmpeg_duration(ffmpeg_path, path)
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 2:
+        print("Usage: python media_probe.py <media_path>")
+        sys.exit(1)
+    print(f"{probe_duration(sys.argv[1]):.3f} seconds")
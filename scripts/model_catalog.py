@@ -0,0 +1,432 @@
+# scripts/model_catalog.py
+
+import os
+import re
+import json
+import time
+import struct
+import sqlite3
+import hashlib
+import logging
+import threading
+
+MODEL_EXTENSIONS = ('.ckpt', '.safetensors')
+KINDS = ("model", "lora")
+MAX_HEADER_BYTES = 100 * 1024 * 1024  # Larger safetensors headers are treated as corrupt
+MAX_METADATA_VALUE = 512  # Longer metadata values (datasets, tag counts) are not stored
+TRIGGER_WORDS = 5  # Most frequent training tags kept as trigger words
+
+def legacy_hash(path):
+    """
+    AUTOMATIC1111's legacy model hash: the first 8 hex digits of the SHA-256 of the 64 KB
+    at offset 1 MB. Cheap enough for network drives, unlike hashing multi-GB files.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        f.seek(0x100000)
+        digest.update(f.read(0x10000))
+    return digest.hexdigest()[:8]
+
+def read_safetensors_metadata(path):
+    """
+    Returns the `__metadata__` of a .safetensors file (training settings, base model,
+    trigger words, ...) by reading only its JSON header, or {} if there is none.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read(8)
+        if len(raw) < 8:
+            return {}
+        (length,) = struct.unpack('<Q', raw)
+        if length > MAX_HEADER_BYTES:
+            raise ValueError(f"Implausible safetensors header size {length}")
+        header = json.loads(f.read(length))
+    metadata = header.get("__metadata__") or {}
+    return {key: str(value) for key, value in metadata.items()}
+
+def base_model_family(value):
+    """Maps a base model or architecture string (e.g., 'sdxl_base_v1-0') to a short family tag."""
+    value = (value or "").lower()
+    for pattern, family in ((r'flux', 'flux'), (r'sd3|stable-diffusion-v3', 'sd3'), (r'xl', 'sdxl'),
+                            (r'v2|sd2|2\.\d', 'sd2'), (r'v1|sd1|1\.\d', 'sd1')):
+        if re.search(pattern, value):
+            return family
+    return None
+
+def describe_metadata(metadata):
+    """
+    Extracts (base_model, trigger_words) from safetensors metadata written by the kohya-ss
+    trainers (ss_*) or following the ModelSpec convention (modelspec.*).
+    """
+    base_model = metadata.get("modelspec.architecture") or metadata.get("ss_base_model_version") \
+        or metadata.get("ss_sd_model_name")
+    triggers = [word.strip() for word in metadata.get("modelspec.trigger_phrase", "").split(",") if word.strip()]
+    try:
+        frequencies = {}
+        for tags in json.loads(metadata.get("ss_tag_frequency") or "{}").values():
+            for tag, count in tags.items():
+                frequencies[tag.strip()] = frequencies.get(tag.strip(), 0) + count
+        triggers += [tag for tag, _ in sorted(frequencies.items(), key=lambda item: -item[1]) if tag not in triggers]
+    except (ValueError, AttributeError):
+        pass
+    return base_model, triggers[:TRIGGER_WORDS]
+
+class ModelCatalog:
+    """
+    Persistent index of Stable Diffusion checkpoints and LoRAs, stored in a SQLite file.
+
+    Each entry holds the file's size, mtime, legacy hash, base model, trigger words and the
+    safetensors header metadata, plus tags (base model family, trigger words, sub-folder
+    names) to filter by. Refreshing is incremental: a directory whose mtime is unchanged is
+    not listed again (its files and sub-folders are taken from the index), and only new or
+    changed files (by size and mtime) have their header read and hash computed, so a
+    refresh of an unchanged library on a network drive costs one stat per folder. Entries
+    can also be synced with what the WebUI reports, which covers libraries that are not
+    mounted on this machine. Safe to share between threads.
+
+    Args:
+        path (str): Path of the SQLite database (e.g., 'outputs/cache/model_catalog.sqlite').
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "kind TEXT, name TEXT, path TEXT, folder TEXT, size INTEGER, mtime REAL, hash TEXT, sha256 TEXT, "
+            "title TEXT, base_model TEXT, trigger_words TEXT, metadata TEXT, local INTEGER, on_server INTEGER, "
+            "indexed REAL, PRIMARY KEY (kind, name))"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS tags (kind TEXT, name TEXT, tag TEXT)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag, kind)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tags_entry ON tags (kind, name)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS folders (kind TEXT, path TEXT, mtime REAL, subfolders TEXT, PRIMARY KEY (kind, path))"
+        )
+        self._conn.commit()
+
+    def _set_tags(self, kind, name, tags):
+        self._conn.execute("DELETE FROM tags WHERE kind = ? AND name = ?", (kind, name))
+        self._conn.executemany(
+            "INSERT INTO tags (kind, name, tag) VALUES (?, ?, ?)",
+            [(kind, name, tag) for tag in sorted({str(tag).strip().lower() for tag in tags if tag and str(tag).strip()})]
+        )
+
+    def _index_file(self, kind, name, path, folder, stat):
+        metadata, error = {}, None
+        try:
+            file_hash = legacy_hash(path)
+            if path.lower().endswith('.safetensors'):
+                metadata = read_safetensors_metadata(path)
+        except (OSError, ValueError) as e:
+            file_hash, error = None, e
+            logging.warning(f"Could not read {path}: {e}")
+        base_model, triggers = describe_metadata(metadata)
+        stored = {key: value for key, value in metadata.items() if len(value) <= MAX_METADATA_VALUE}
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256, title, on_server FROM entries WHERE kind = ? AND name = ?", (kind, name)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (kind, name, path, folder, size, mtime, hash, sha256, title, base_model, "
+                "trigger_words, metadata, local, on_server, indexed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?)",
+                (kind, name, path, folder, stat.st_size, stat.st_mtime, file_hash,
+                 row["sha256"] if row else None, row["title"] if row else None, base_model, json.dumps(triggers),
+                 json.dumps(stored), row["on_server"] if row else 0, time.time())
+            )
+            folders = name.split('/')[:-1]
+            self._set_tags(kind, name, [base_model_family(base_model), *triggers, *folders])
+        return error is None
+
+    def refresh(self, kind, directory, full=False):
+        """
+        Brings the entries of `kind` ('model' or 'lora') in line with `directory` and its
+        sub-folders. With `full`, every folder is listed and every file compared again.
+
+        Returns:
+            dict: Counts of 'indexed' (new or changed files read), 'removed' entries and
+            'listed' folders (those whose mtime had changed).
+        """
+        counts = {"indexed": 0, "removed": 0, "listed": 0}
+        if not os.path.isdir(directory):
+            logging.warning(f"{kind.capitalize()} directory {directory} is not available; keeping the indexed entries.")
+            return counts
+        root = os.path.abspath(directory)
+        with self._lock:
+            folders = {row["path"]: row for row in self._conn.execute("SELECT * FROM folders WHERE kind = ?", (kind,))}
+            known = {row["name"]: row for row in self._conn.execute(
+                "SELECT name, folder, size, mtime FROM entries WHERE kind = ? AND local = 1", (kind,)
+            )}
+        seen, visited = set(), set()
+        pending = [root]
+        while pending:
+            folder = pending.pop()
+            try:
+                mtime = os.stat(folder).st_mtime
+            except OSError:
+                continue
+            visited.add(folder)
+            relative = os.path.relpath(folder, root).replace(os.sep, '/')
+            prefix = "" if relative == "." else relative + "/"
+            record = folders.get(folder)
+            if record is not None and record["mtime"] == mtime and not full:
+                # Unchanged folder: same files and sub-folders as when it was last listed
+                seen.update(name for name, row in known.items() if row["folder"] == folder)
+                pending += json.loads(record["subfolders"])
+                continue
+            counts["listed"] += 1
+            subfolders = []
+            try:
+                with os.scandir(folder) as scan:
+                    for entry in scan:
+                        if entry.is_dir():
+                            subfolders.append(entry.path)
+                        elif entry.name.lower().endswith(MODEL_EXTENSIONS):
+                            name = prefix + entry.name
+                            seen.add(name)
+                            stat = entry.stat()
+                            row = known.get(name)
+                            if row is None or row["size"] != stat.st_size or row["mtime"] != stat.st_mtime:
+                                self._index_file(kind, name, entry.path, folder, stat)
+                                counts["indexed"] += 1
+            except OSError as e:
+                logging.error(f"Error listing {folder}: {e}")
+                continue
+            pending += subfolders
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO folders (kind, path, mtime, subfolders) VALUES (?, ?, ?, ?)",
+                    (kind, folder, mtime, json.dumps(subfolders))
+                )
+        with self._lock:
+            for name in set(known) - seen:
+                # Still listed by the server: keep it as a server-only entry
+                self._conn.execute(
+                    "UPDATE entries SET local = 0, path = NULL, folder = NULL WHERE kind = ? AND name = ? AND on_server = 1",
+                    (kind, name)
+                )
+                if self._conn.execute(
+                    "DELETE FROM entries WHERE kind = ? AND name = ? AND on_server = 0", (kind, name)
+                ).rowcount:
+                    self._conn.execute("DELETE FROM tags WHERE kind = ? AND name = ?", (kind, name))
+                counts["removed"] += 1
+            for folder in set(folders) - visited:
+                self._conn.execute("DELETE FROM folders WHERE kind = ? AND path = ?", (kind, folder))
+            self._conn.commit()
+        if counts["indexed"] or counts["removed"]:
+            logging.info(f"{kind.capitalize()} catalog: {counts['indexed']} files indexed, {counts['removed']} removed "
+                         f"({counts['listed']} folders listed).")
+        return counts
+
+    def sync_server(self, kind, items):
+        """
+        Merges the WebUI's listing of `kind`: /sdapi/v1/sd-models items for 'model',
+        /sdapi/v1/loras items for 'lora'. Entries are matched by file name; files only
+        the server has are added as server-only entries, and server-only entries it no
+        longer lists are dropped. Returns the number of entries the server listed.
+        """
+        with self._lock:
+            local = {}
+            for row in self._conn.execute("SELECT name FROM entries WHERE kind = ? AND local = 1", (kind,)):
+                local.setdefault(os.path.basename(row["name"]).lower(), row["name"])
+            self._conn.execute("UPDATE entries SET on_server = 0 WHERE kind = ?", (kind,))
+            for item in items:
+                server_path = item.get("filename") or item.get("path") or ""
+                file_name = re.split(r'[\\/]', server_path)[-1] or item.get("model_name") or item.get("name")
+                if not file_name:
+                    continue
+                name = local.get(file_name.lower())
+                title = item.get("title") or item.get("alias") or item.get("name")
+                if name is not None:
+                    self._conn.execute(
+                        "UPDATE entries SET on_server = 1, title = ?, sha256 = COALESCE(?, sha256) WHERE kind = ? AND name = ?",
+                        (title, item.get("sha256"), kind, name)
+                    )
+                    continue
+                metadata = {key: str(value) for key, value in (item.get("metadata") or {}).items()}
+                base_model, triggers = describe_metadata(metadata)
+                stored = {key: value for key, value in metadata.items() if len(value) <= MAX_METADATA_VALUE}
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (kind, name, path, folder, size, mtime, hash, sha256, title, base_model, "
+                    "trigger_words, metadata, local, on_server, indexed) "
+                    "VALUES (?, ?, ?, NULL, NULL, NULL, ?, ?, ?, ?, ?, ?, 0, 1, ?)",
+                    (kind, file_name, server_path, item.get("hash"), item.get("sha256"), title, base_model,
+                     json.dumps(triggers), json.dumps(stored), time.time())
+                )
+                self._set_tags(kind, file_name, [base_model_family(base_model), *triggers])
+            removed = self._conn.execute(
+                "DELETE FROM entries WHERE kind = ? AND local = 0 AND on_server = 0", (kind,)
+            ).rowcount
+            self._conn.execute(
+                "DELETE FROM tags WHERE kind = ? AND name NOT IN (SELECT name FROM entries WHERE kind = ?)", (kind, kind)
+            )
+            self._conn.commit()
+        if removed:
+            logging.info(f"Dropped {removed} {kind} entries the server no longer lists.")
+        return len(items)
+
+    def sync(self, client):
+        """
+        Syncs checkpoints and LoRAs with every endpoint of a StableDiffusionDispatcher (or a
+        single StableDiffusionClient). Endpoints that do not answer are skipped. Returns
+        True if any endpoint answered.
+        """
+        clients = [node.client for node in client.nodes] if hasattr(client, "nodes") else [client]
+        answered = False
+        for kind, method in (("model", "list_models"), ("lora", "list_loras")):
+            listings = [getattr(endpoint, method)() for endpoint in clients]
+            listings = [items for items in listings if isinstance(items, list)]
+            if listings:
+                answered = True
+                self.sync_server(kind, [item for items in listings for item in items if isinstance(item, dict)])
+        if not answered:
+            logging.warning("No Stable Diffusion endpoint answered; the model catalog was not synced with the server.")
+        return answered
+
+    def entries(self, kind=None, tag=None):
+        """Returns the catalog entries (dicts), optionally of one kind and/or carrying `tag`, sorted by name."""
+        query, params = "SELECT * FROM entries WHERE 1 = 1", []
+        if kind:
+            query += " AND kind = ?"
+            params.append(kind)
+        if tag:
+            query += " AND EXISTS (SELECT 1 FROM tags WHERE tags.kind = entries.kind AND tags.name = entries.name AND tag = ?)"
+            params.append(tag.strip().lower())
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY kind, name COLLATE NOCASE", params).fetchall()
+            tags = {}
+            for row in self._conn.execute("SELECT kind, name, tag FROM tags"):
+                tags.setdefault((row["kind"], row["name"]), []).append(row["tag"])
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            entry["trigger_words"] = json.loads(entry["trigger_words"] or "[]")
+            entry["metadata"] = json.loads(entry["metadata"] or "{}")
+            entry["tags"] = sorted(tags.get((entry["kind"], entry["name"]), []))
+            entries.append(entry)
+        return entries
+
+    def names(self, kind, tag=None):
+        """Returns the names of the entries of `kind` (paths relative to their directory, '/'-separated)."""
+        return [entry["name"] for entry in self.entries(kind, tag)]
+
+    def choices(self, kind, tag=None):
+        """
+        Returns the values to use for `sd_model` / `lora_model` for the entries of `kind`: the
+        server's title for entries the WebUI lists (what it accepts when switching), the bare
+        file name for local-only ones.
+        """
+        values = [
+            entry["title"] if entry["on_server"] and entry["title"] else os.path.basename(entry["name"])
+            for entry in self.entries(kind, tag)
+        ]
+        return list(dict.fromkeys(values))
+
+    def find(self, kind, name):
+        """Returns the entry of `kind` named `name` (or with that file name), or None."""
+        for entry in self.entries(kind):
+            if entry["name"] == name or os.path.basename(entry["name"]).lower() == os.path.basename(name).lower():
+                return entry
+        return None
+
+    def tags(self, kind=None):
+        """Returns {tag: number of entries} for every tag, optionally of one kind."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT tag, COUNT(*) FROM tags WHERE ? IS NULL OR kind = ? GROUP BY tag ORDER BY COUNT(*) DESC, tag",
+                (kind, kind)
+            ).fetchall()
+        return {tag: count for tag, count in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+def get_model_catalog(config):
+    """
+    Returns the shared ModelCatalog for the given config, or None if `model_catalog_enabled` is false.
+    """
+    if not config.get('model_catalog_enabled', True):
+        return None
+    path = config.get('model_catalog_path', os.path.join("outputs", "cache", "model_catalog.sqlite"))
+    with _catalogs_lock:
+        catalog = _catalogs.get(path)
+        if catalog is None:
+            catalog = ModelCatalog(path)
+            _catalogs[path] = catalog
+        return catalog
+
+def load_model_catalog(config, models_directory, loras_directory, sd_client=None, full=False):
+    """
+    Refreshes the catalog from the model and LoRA directories and, with `model_catalog_sync`
+    and an SD client, from the WebUI. Returns the catalog, or None if it is disabled.
+    """
+    catalog = get_model_catalog(config)
+    if catalog is None:
+        return None
+    started = time.perf_counter()
+    catalog.refresh("model", models_directory, full=full)
+    catalog.refresh("lora", loras_directory, full=full)
+    if sd_client is not None and config.get('model_catalog_sync', True):
+        catalog.sync(sd_client)
+    logging.info(f"Model catalog loaded in {time.perf_counter() - started:.2f}s.")
+    return catalog
+
+if __name__ == "__main__":
+    import argparse
+    import yaml
+    try:
+        from scripts.sd_client import get_sd_client
+    except ImportError:
+        from sd_client import get_sd_client
+    parser = argparse.ArgumentParser(description="Index, sync and query the Stable Diffusion model and LoRA catalog.")
+    parser.add_argument("--config", default=os.path.join("config", "config.yaml"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    refresh_parser = subparsers.add_parser("refresh", help="Index new or changed files and sync with the WebUI")
+    refresh_parser.add_argument("--full", action="store_true", help="List every folder and compare every file again")
+    refresh_parser.add_argument("--no-sync", action="store_true", help="Do not query the WebUI")
+    list_parser = subparsers.add_parser("list", help="List catalog entries")
+    list_parser.add_argument("--kind", choices=KINDS)
+    list_parser.add_argument("--tag", help="Only entries with this tag (e.g., sdxl or a trigger word)")
+    show_parser = subparsers.add_parser("show", help="Show one entry with its metadata")
+    show_parser.add_argument("kind", choices=KINDS)
+    show_parser.add_argument("name")
+    tags_parser = subparsers.add_parser("tags", help="List tags and how many entries carry them")
+    tags_parser.add_argument("--kind", choices=KINDS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+    config['model_catalog_enabled'] = True
+    if args.command == "refresh":
+        catalog = load_model_catalog(
+            config, config.get('models_directory', 'models'), config.get('loras_directory', 'loras'),
+            sd_client=None if args.no_sync else get_sd_client(config), full=args.full
+        )
+        counts = {kind: len(catalog.names(kind)) for kind in KINDS}
+        print(f"{counts['model']} models, {counts['lora']} LoRAs in {catalog.path}")
+    else:
+        catalog = get_model_catalog(config)
+        if args.command == "list":
+            for entry in catalog.entries(args.kind, args.tag):
+                where = "local+server" if entry["local"] and entry["on_server"] else "local" if entry["local"] else "server"
+                size = f"{entry['size'] / (1024 * 1024):8.1f} MB" if entry["size"] is not None else f"{'-':>11}"
+                print(f"{entry['kind']:<5} {entry['name']:<48} {size}  {entry['hash'] or '-':<10} {where:<12} "
+                      f"{', '.join(entry['tags'])}")
+        elif args.command == "show":
+            entry = catalog.find(args.kind, args.name)
+            if entry is None:
+                print(f"No {args.kind} named {args.name} in the catalog.")
+            else:
+                print(json.dumps(entry, indent=2, ensure_ascii=False))
+        elif args.command == "tags":
+            for tag, count in catalog.tags(args.kind).items():
+                print(f"{count:5}  {tag}")
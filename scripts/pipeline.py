@@ -0,0 +1,192 @@
+# scripts/pipeline.py
+
+import os
+import time
+import queue
+import logging
+import threading
+
+try:
+    from scripts.prompt_generator import generate_prompt
+    from scripts.image_generator import render_image
+    from scripts.image_editor import enhance_image, get_enhancement_settings, get_compress_level
+    from scripts.llm_client import get_llm_client
+    from scripts.instrumentation import traced
+    from scripts.sd_client import get_sd_client
+except ImportError:
+    from prompt_generator import generate_prompt
+    from image_generator import render_image
+    from image_editor import enhance_image, get_enhancement_settings, get_compress_level
+    from llm_client import get_llm_client
+    from instrumentation import traced
+    from sd_client import get_sd_client
+
+_DONE = object()
+
+class _Stage:
+    """
+    A pool of worker threads that reads (idx, value) items from `in_queue`, applies
+    `func` and writes (idx, result) to `out_queue`.
+
+    A value of None marks an item that failed upstream; it is passed through untouched
+    so downstream stages still see every index. The stage forwards the end-of-stream
+    marker once its last worker has finished.
+    """
+
+    def __init__(self, name, func, in_queue, out_queue, workers):
+        self.name = name
+        self.func = func
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.busy_seconds = 0.0
+        self.processed = 0
+        self._remaining = workers
+        self._lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            item = self.in_queue.get()
+            if item is _DONE:
+                # Let sibling workers see the marker too
+                self.in_queue.put(_DONE)
+                break
+            idx, value = item
+            result = None
+            if value is not None:
+                started = time.perf_counter()
+                try:
+                    result = self.func(idx, value)
+                except Exception as e:
+                    logging.error(f"Pipeline stage '{self.name}' failed for item {idx}: {e}")
+                with self._lock:
+                    self.busy_seconds += time.perf_counter() - started
+                    self.processed += 1
+            self.out_queue.put((idx, result))
+        with self._lock:
+            self._remaining -= 1
+            last = self._remaining == 0
+        if last:
+            self.out_queue.put(_DONE)
+
+@traced("run_pipeline", hot=True)
+def run_pipeline(key_points, config, image_dir, model=None, lora=None, style=None,
+                 prompt_fn=None, image_fn=None, enhance_fn=None, on_frame=None, scene_numbers=None):
+    """
+    Runs prompt generation, image generation and enhancement as overlapping stages.
+
+    Each prompt is queued for rendering as soon as it is produced, and each rendered
+    image is handed to a separate enhancement worker in memory while the next one
+    renders, so only the enhanced image is written to disk. Stage concurrency
+    and the queue depth between stages come from the `pipeline` section of the config.
+
+    Args:
+        key_points (list): Key points to turn into scenes.
+        config (dict): Loaded configuration.
+        image_dir (str): Directory for generated and enhanced images.
+        model (str, optional): Stable Diffusion model.
+        lora (str, optional): LoRA model.
+        style (str, optional): Image style.
+        prompt_fn (callable, optional): (point, config) -> prompt. Defaults to generate_prompt.
+        image_fn (callable, optional): Same signature as render_image, returning a decoded image
+            (or None on failure). Defaults to render_image.
+        enhance_fn (callable, optional): (image, output_path) -> path. Defaults to enhance_image
+            with the factors from the `image_enhancement` config section.
+        on_frame (callable, optional): Called as on_frame(idx, enhanced_path) in scene order as soon
+            as every earlier scene is finished, so assembly can start on a prefix of frames.
+            Failed scenes are reported with a path of None.
+        scene_numbers (list, optional): 1-based scene number of each key point, used to name the
+            enhanced images (default 1..n), so a resumed run can render just the missing scenes.
+
+    Returns:
+        tuple: (prompts, image_paths) where prompts has one entry per key point and
+        image_paths lists the enhanced images that succeeded, in scene order.
+    """
+    settings = config.get('pipeline') or {}
+    prompt_workers = max(1, int(settings.get('prompt_workers', config.get('llm_concurrency', 1))))
+    image_workers = int(settings.get('image_workers', 0)) or get_sd_client(config).capacity
+    enhance_workers = max(1, int(settings.get('enhance_workers', 2)))
+    queue_size = max(1, int(settings.get('queue_size', 4)))
+
+    if prompt_fn is None:
+        client = get_llm_client(config)
+        prompt_fn = lambda point, cfg: generate_prompt(point, cfg, client)
+    image_fn = image_fn or render_image
+    if enhance_fn is None:
+        brightness, contrast = get_enhancement_settings(config)
+        compress_level = get_compress_level(config)
+        enhance_fn = lambda image, output_path: enhance_image(image, output_path, brightness, contrast, compress_level)
+    os.makedirs(image_dir, exist_ok=True)
+
+    prompts = [None] * len(key_points)
+
+    def make_prompt(idx, point):
+        try:
+            prompts[idx] = prompt_fn(point, config)
+        except Exception as e:
+            logging.error(f"Error generating prompt for key point '{point}': {e}")
+            prompts[idx] = f"Image for: {point}"
+        return prompts[idx]
+
+    def render(idx, prompt):
+        image = image_fn(prompt, config, model=model, lora=lora, style=style)
+        if image is None:
+            logging.error(f"Failed to generate image for prompt {idx + 1}.")
+        return image
+
+    numbers = scene_numbers or list(range(1, len(key_points) + 1))
+
+    def enhance(idx, image):
+        enhanced_path = os.path.join(image_dir, f"enhanced_image_{numbers[idx]}.png")
+        return enhance_fn(image, enhanced_path)
+
+    point_queue = queue.Queue()
+    image_queue = queue.Queue(maxsize=queue_size)
+    enhance_queue = queue.Queue(maxsize=queue_size)
+    done_queue = queue.Queue()
+    stages = [
+        _Stage("prompt", make_prompt, point_queue, image_queue, prompt_workers),
+        _Stage("image", render, image_queue, enhance_queue, image_workers),
+        _Stage("enhance", enhance, enhance_queue, done_queue, enhance_workers),
+    ]
+    logging.info(
+        f"Starting pipeline for {len(key_points)} scenes: {prompt_workers} prompt, {image_workers} image, "
+        f"{enhance_workers} enhance workers, queue size {queue_size}."
+    )
+    started = time.perf_counter()
+    for stage in stages:
+        stage.start()
+    for idx, point in enumerate(key_points):
+        point_queue.put((idx, point))
+    point_queue.put(_DONE)
+
+    # Release finished frames in scene order as soon as the prefix before them is complete
+    finished = {}
+    next_idx = 0
+    image_paths = []
+    while True:
+        item = done_queue.get()
+        if item is _DONE:
+            break
+        idx, enhanced_path = item
+        finished[idx] = enhanced_path
+        while next_idx in finished:
+            path = finished.pop(next_idx)
+            if path:
+                image_paths.append(path)
+            if on_frame:
+                on_frame(next_idx, path)
+            next_idx += 1
+
+    elapsed = time.perf_counter() - started
+    for stage in stages:
+        logging.info(f"Pipeline stage '{stage.name}': {stage.processed} items, {stage.busy_seconds:.2f}s busy.")
+    logging.info(f"Pipeline finished {len(image_paths)}/{len(key_points)} scenes in {elapsed:.2f}s.")
+    return prompts, image_paths
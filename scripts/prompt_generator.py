@@ -1,8 +1,43 @@
 # scripts/prompt_generator.py
 
 import yaml
-import subprocess
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from scripts.llm_client import get_llm_client
+    from scripts.instrumentation import traced
+except ImportError:
+    from llm_client import get_llm_client
+    from instrumentation import traced
+
+BATCH_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "prompts": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "index": {"type": "integer"},
+                    "prompt": {"type": "string"},
+                },
+                "required": ["index", "prompt"],
+            },
+        },
+    },
+    "required": ["prompts"],
+}
+
+PROMPT_TEMPLATE = "Generate a detailed image prompt for the following key point: {point}"
+
+BATCH_PROMPT_TEMPLATE = (
+    "Generate a detailed image prompt for each of the following key points.\n"
+    'Respond only with JSON of the form {{"prompts": [{{"index": 1, "prompt": "..."}}]}}, '
+    "with exactly one entry per key point, using the key point's number as its index.\n\n"
+    "{numbered}"
+)
 
 def load_config(config_path):
     try:
@@ -13,25 +48,109 @@ def load_config(config_path):
         logging.error(f"Error loading config: {e}")
         return {}
 
-def generate_prompts(key_points, config):
-    prompts = []
-    for point in key_points:
+def generate_prompt(point, config, client=None):
+    """
+    Generates a single image prompt for a key point.
+
+    Falls back to "Image for: {point}" if the LLM call fails, times out or returns nothing.
+    """
+    client = client or get_llm_client(config)
+    try:
+        # Use LLM to generate image prompt for the key point
+        prompt_text = PROMPT_TEMPLATE.format(point=point)
+        logging.info(f"Requesting LLM prompt generation ({client.model}): {prompt_text}")
+        output = client.generate(prompt_text)
+        if not output:
+            logging.error(f"LLM returned an empty prompt for key point '{point}'.")
+            return f"Image for: {point}"
+        logging.info(f"Generated prompt: {output}")
+        return output
+    except Exception as e:
+        logging.error(f"Error generating prompt for key point '{point}': {e}")
+        return f"Image for: {point}"
+
+def parse_prompt_batch(output, count):
+    """Splits a batched JSON response into `count` prompts (None for missing or malformed entries)."""
+    results = [None] * count
+    for position, entry in enumerate(json.loads(output).get("prompts", [])):
         try:
-            # Use LLM to generate image prompt for the key point
-            prompt_text = f"Generate a detailed image prompt for the following key point: {point}"
-            command = ["ollama", "run", "hf.co/ArliAI/Mistral-Small-22B-ArliAI-RPMax-v1.1-GGUF:latest", prompt_text]
-            logging.info(f"Running LLM command for prompt generation: {' '.join(command)}")
-            result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8')  # Updated line
-            if result.returncode != 0:
-                logging.error(f"LLM command failed for key point '{point}': {result.stderr}")
-                prompts.append(f"Image for: {point}")
-                continue
-            output = result.stdout.strip()
-            prompts.append(output)
-            logging.info(f"Generated prompt: {output}")
+            idx = int(entry.get("index", position + 1)) - 1
+            text = str(entry["prompt"]).strip()
         except Exception as e:
-            logging.error(f"Error generating prompt for key point '{point}': {e}")
-            prompts.append(f"Image for: {point}")
+            logging.warning(f"Skipping malformed batched prompt entry {entry!r}: {e}")
+            continue
+        if 0 <= idx < count and text and results[idx] is None:
+            results[idx] = text
+    return results
+
+def _usable_batch(output, count):
+    # Whether a batched response yields any prompt; others are not cached
+    try:
+        return any(parse_prompt_batch(output, count))
+    except Exception:
+        return False
+
+def generate_prompt_batch(points, config, client=None):
+    """
+    Generates image prompts for several key points with a single LLM request.
+
+    The model is asked for a JSON object of the form
+    {"prompts": [{"index": 1, "prompt": "..."}, ...]}, which is split back into one
+    prompt per key point.
+
+    Returns:
+        list: One prompt per key point, or None for entries that are missing or unparseable.
+    """
+    client = client or get_llm_client(config)
+    numbered = "\n".join(f"{idx}. {point}" for idx, point in enumerate(points, 1))
+    prompt_text = BATCH_PROMPT_TEMPLATE.format(numbered=numbered)
+    try:
+        logging.info(f"Requesting batched LLM prompt generation ({client.model}) for {len(points)} key points.")
+        output = client.generate(
+            prompt_text, format=BATCH_RESPONSE_SCHEMA, validate=lambda text: _usable_batch(text, len(points))
+        )
+        results = parse_prompt_batch(output, len(points))
+    except Exception as e:
+        logging.error(f"Error generating batched prompts: {e}")
+        return [None] * len(points)
+    for text in filter(None, results):
+        logging.info(f"Generated prompt: {text}")
+    return results
+
+def _run_concurrently(func, items, config):
+    # map() yields results in submission order, so outputs line up with items
+    concurrency = max(1, int(config.get('llm_concurrency', 1)))
+    if concurrency == 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    workers = min(concurrency, len(items))
+    logging.info(f"Running {len(items)} LLM requests with {workers} concurrent workers.")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm") as executor:
+        return list(executor.map(func, items))
+
+@traced("generate_prompts")
+def generate_prompts(key_points, config):
+    """
+    Generates one image prompt per key point, in key point order.
+
+    With `prompt_batch_size` > 1 in the config, key points are sent to the LLM in batches
+    of that size and only entries the batch response is missing are retried one by one.
+    With `llm_concurrency` > 1, up to that many requests are in flight at once on a
+    bounded thread pool; each key point still falls back individually on failure.
+    """
+    client = get_llm_client(config)
+    batch_size = int(config.get('prompt_batch_size', 0))
+    if batch_size <= 1:
+        return _run_concurrently(lambda point: generate_prompt(point, config, client), key_points, config)
+
+    batches = [key_points[i:i + batch_size] for i in range(0, len(key_points), batch_size)]
+    batch_results = _run_concurrently(lambda batch: generate_prompt_batch(batch, config, client), batches, config)
+    prompts = [prompt for batch in batch_results for prompt in batch]
+    missing = [idx for idx, prompt in enumerate(prompts) if prompt is None]
+    if missing:
+        logging.warning(f"Batched generation missed {len(missing)} of {len(prompts)} prompts; retrying them individually.")
+        retried = _run_concurrently(lambda idx: generate_prompt(key_points[idx], config, client), missing, config)
+        for idx, prompt in zip(missing, retried):
+            prompts[idx] = prompt
     return prompts
 
 if __name__ == "__main__":
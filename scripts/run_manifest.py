@@ -0,0 +1,296 @@
+# scripts/run_manifest.py
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+
+try:
+    from scripts.script_processor import process_script
+    from scripts.prompt_generator import generate_prompts, PROMPT_TEMPLATE, BATCH_PROMPT_TEMPLATE, BATCH_RESPONSE_SCHEMA
+    from scripts.llm_client import DEFAULT_LLM_MODEL
+    from scripts.image_generator import generate_images
+    from scripts.image_editor import get_enhancement_settings
+except ImportError:
+    from script_processor import process_script
+    from prompt_generator import generate_prompts, PROMPT_TEMPLATE, BATCH_PROMPT_TEMPLATE, BATCH_RESPONSE_SCHEMA
+    from llm_client import DEFAULT_LLM_MODEL
+    from image_generator import generate_images
+    from image_editor import get_enhancement_settings
+
+MANIFEST_NAME = "manifest.json"
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def fingerprint(value):
+    """Returns a short stable hash of any JSON-serializable value."""
+    material = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()[:16]
+
+class RunManifest:
+    """
+    Checkpoint manifest of one run, stored as `<run_dir>/manifest.json`.
+
+    Records each finished stage (key points and characters, prompts, rendered images,
+    enhanced images, video) so a rerun can resume from the first incomplete stage.
+    File artifacts are stored with their SHA-256 and are only reused if the file on
+    disk still matches it. The manifest is rewritten atomically after every update, so
+    a crash loses at most the artifact in progress. Safe to share between threads.
+
+    Args:
+        run_dir (str): Directory of the run; images are kept in its `images/` folder.
+    """
+
+    def __init__(self, run_dir):
+        self.run_dir = run_dir
+        self.path = os.path.join(run_dir, MANIFEST_NAME)
+        self.image_dir = os.path.join(run_dir, "images")
+        self._lock = threading.Lock()
+        os.makedirs(self.image_dir, exist_ok=True)
+        self.data = {"stages": {}, "artifacts": {}}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+                self.data.setdefault("stages", {})
+                self.data.setdefault("artifacts", {})
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable run manifest {self.path}: {e}")
+
+    def _save(self):
+        self.data["updated"] = time.time()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def stage(self, name, signature=None):
+        """
+        Returns the recorded result of stage `name`, or None if it has not finished or was
+        recorded with a different `signature` (i.e., its inputs changed).
+        """
+        with self._lock:
+            entry = self.data["stages"].get(name)
+        if entry is None or (signature is not None and entry.get("signature") != signature):
+            return None
+        return entry["result"]
+
+    def set_stage(self, name, result, signature=None):
+        with self._lock:
+            self.data["stages"][name] = {"result": result, "signature": signature, "finished": time.time()}
+            self._save()
+
+    def artifact(self, kind, index, signature=None):
+        """
+        Returns the path of a recorded file artifact (e.g., kind 'image', index 3) if the
+        file still exists, its checksum matches and it was made from the same `signature`;
+        otherwise None.
+        """
+        with self._lock:
+            record = self.data["artifacts"].get(kind, {}).get(str(index))
+        if record is None or (signature is not None and record.get("signature") != signature):
+            return None
+        path = record["path"]
+        if not os.path.isfile(path):
+            return None
+        if os.path.getsize(path) != record.get("size") or file_sha256(path) != record["sha256"]:
+            logging.warning(f"Checksum mismatch for {path}; it will be regenerated.")
+            return None
+        return path
+
+    def record_artifact(self, kind, index, path, signature=None):
+        record = {
+            "path": path,
+            "sha256": file_sha256(path),
+            "size": os.path.getsize(path),
+            "signature": signature,
+            "finished": time.time(),
+        }
+        with self._lock:
+            self.data["artifacts"].setdefault(kind, {})[str(index)] = record
+            self._save()
+        return record["sha256"]
+
+    def summary(self):
+        with self._lock:
+            stages = sorted(self.data["stages"])
+            artifacts = {kind: len(records) for kind, records in self.data["artifacts"].items()}
+        return {"stages": stages, "artifacts": artifacts}
+
+def open_run(config, story_path, name=None, fresh=False, key=None, base_path=BASE_PATH):
+    """
+    Returns the RunManifest for a story, or None if `resume_runs` is false in the config.
+
+    The run directory (`runs_dir`/<story>_<hash>) is derived from the story text, so
+    rerunning a story finds its earlier checkpoints while an edited story starts a new
+    run. Render settings are part of each artifact's signature instead, so changing the
+    model or style only redoes the stages they affect. `key` (any JSON-serializable value)
+    is hashed into the directory name too, for callers that run one story several ways at
+    the same time. `name` overrides the directory name; `fresh` discards the existing
+    checkpoints so every stage runs again. A relative `runs_dir` is resolved against
+    `base_path` (default: the project root), like the other paths in the config.
+    """
+    if not config.get('resume_runs', True):
+        return None
+    runs_dir = os.path.join(base_path, config.get('runs_dir', os.path.join("outputs", "runs")))
+    if name is None:
+        stem = os.path.splitext(os.path.basename(story_path))[0]
+        slug = re.sub(r'[^A-Za-z0-9._-]+', '_', stem).strip('_') or "story"
+        digest = file_sha256(story_path) if key is None else fingerprint([file_sha256(story_path), key])
+        name = f"{slug}_{digest[:12]}"
+    run_dir = os.path.join(runs_dir, name)
+    if fresh and os.path.exists(os.path.join(run_dir, MANIFEST_NAME)):
+        os.remove(os.path.join(run_dir, MANIFEST_NAME))
+    manifest = RunManifest(run_dir)
+    summary = manifest.summary()
+    if summary["stages"] or summary["artifacts"]:
+        logging.info(f"Resuming run {manifest.run_dir}: {len(summary['stages'])} stages, artifacts {summary['artifacts']}.")
+    return manifest
+
+def scene_signature(prompt, config, model=None, lora=None, style=None):
+    """Identifies an enhanced scene image by everything that went into it."""
+    return fingerprint([prompt, model, lora, style, *get_enhancement_settings(config)])
+
+def resume_script(manifest, script_path, config):
+    """Returns (key_points, characters), from the manifest when the story is unchanged."""
+    signature = file_sha256(script_path) if manifest else None
+    cached = manifest.stage("script", signature) if manifest else None
+    if cached:
+        logging.info("Reusing checkpointed script analysis.")
+        return cached["key_points"], cached["characters"]
+    key_points, characters = process_script(script_path, config)
+    if manifest and key_points:
+        manifest.set_stage("script", {"key_points": key_points, "characters": characters}, signature)
+    return key_points, characters
+
+def prompt_signature(point, config):
+    """Identifies a generated prompt by its key point, the LLM and its settings, and the prompt templates."""
+    return fingerprint([
+        point, config.get('llm_model', DEFAULT_LLM_MODEL), config.get('llm_options'),
+        PROMPT_TEMPLATE, BATCH_PROMPT_TEMPLATE, BATCH_RESPONSE_SCHEMA,
+    ])
+
+def checkpointed_prompt(manifest, idx, point, config):
+    return manifest.stage(f"prompt_{idx}", prompt_signature(point, config)) if manifest else None
+
+def record_prompt(manifest, idx, point, prompt, config):
+    if manifest and prompt:
+        manifest.set_stage(f"prompt_{idx}", prompt, prompt_signature(point, config))
+
+def resume_prompts(manifest, key_points, config):
+    """Returns one prompt per key point, generating only those not checkpointed."""
+    prompts = [checkpointed_prompt(manifest, idx, point, config) for idx, point in enumerate(key_points)]
+    missing = [idx for idx, prompt in enumerate(prompts) if prompt is None]
+    if len(missing) < len(prompts):
+        logging.info(f"Reusing {len(prompts) - len(missing)} checkpointed prompts.")
+    if missing:
+        generated = generate_prompts([key_points[idx] for idx in missing], config)
+        if not generated:
+            return []
+        for idx, prompt in zip(missing, generated):
+            prompts[idx] = prompt
+            record_prompt(manifest, idx, key_points[idx], prompt, config)
+    return prompts
+
+def resume_scenes(manifest, prompts, config, image_dir, enhance, model=None, lora=None, style=None, render=None):
+    """
+    Renders and enhances the scenes that have no valid checkpoint.
+
+    A scene whose enhanced image still matches its checksum and signature is skipped
+    entirely; otherwise a checkpointed raw render is reused if valid, and only the rest
+    go to Stable Diffusion. Each render is checkpointed the moment it finishes.
+
+    Fresh renders are handed to `enhance` as the encoded bytes kept by the render, so
+    the raw files are only written (as checkpoints), never read back.
+
+    Args:
+        enhance (callable): (sources, output_paths) -> list of result paths, where each
+            source is an image path or encoded image bytes.
+        render (callable, optional): Same signature as generate_images (the default).
+
+    Returns:
+        list: (idx, image_path) for every scene that has an image, in scene order.
+    """
+    render = render or generate_images
+    os.makedirs(image_dir, exist_ok=True)
+    raw_paths = [os.path.join(image_dir, f"image_{idx}.png") for idx in range(1, len(prompts) + 1)]
+    enhanced_paths = [os.path.join(image_dir, f"enhanced_image_{idx}.png") for idx in range(1, len(prompts) + 1)]
+    render_signatures = [fingerprint([prompt, model, lora, style]) for prompt in prompts]
+    scene_signatures = [scene_signature(prompt, config, model, lora, style) for prompt in prompts]
+
+    finished = {}
+    rendered = {}  # Scene index -> encoded bytes of a fresh render
+    to_enhance, to_render = [], []
+    for idx in range(len(prompts)):
+        if manifest and manifest.artifact("enhanced", idx, scene_signatures[idx]):
+            finished[idx] = enhanced_paths[idx]
+        elif manifest and manifest.artifact("image", idx, render_signatures[idx]):
+            to_enhance.append(idx)
+        else:
+            to_render.append(idx)
+    if manifest and len(to_render) < len(prompts):
+        logging.info(f"Reusing {len(finished)} enhanced and {len(to_enhance)} rendered images from checkpoints.")
+
+    if to_render:
+        def checkpoint(position, success):
+            if success and manifest:
+                idx = to_render[position]
+                manifest.record_artifact("image", idx, raw_paths[idx], render_signatures[idx])
+
+        images = {}
+        results = render(
+            [prompts[idx] for idx in to_render], config, [raw_paths[idx] for idx in to_render],
+            model=model, lora=lora, style=style, on_result=checkpoint, images=images
+        )
+        rendered = {to_render[position]: data for position, data in images.items()}
+        to_enhance += [idx for idx, success in zip(to_render, results) if success]
+        to_enhance.sort()
+
+    if to_enhance:
+        results = enhance(
+            [rendered.get(idx) or raw_paths[idx] for idx in to_enhance], [enhanced_paths[idx] for idx in to_enhance]
+        )
+        for idx, result in zip(to_enhance, results):
+            result = result or (raw_paths[idx] if idx in rendered else None)  # Unenhanced, as for a failed path
+            if not result:
+                continue
+            finished[idx] = result
+            if manifest and result == enhanced_paths[idx]:
+                manifest.record_artifact("enhanced", idx, result, scene_signatures[idx])
+    return sorted(finished.items())
+
+def video_signature(image_paths, audio_path, config, durations=None):
+    """Identifies a video by its input images, audio and every setting the encoder reads."""
+    audio_stat = os.stat(audio_path)
+    settings = {key: config.get(key) for key in (
+        'video_engine', 'encoding_profile', 'motion', 'transition', 'scene_timing',
+        'scene_timing_snap', 'scene_timing_min_seconds'
+    )}
+    settings['profile'] = (config.get('encoding_profiles') or {}).get(config.get('encoding_profile', 'shorts'))
+    return fingerprint([
+        [file_sha256(path) for path in image_paths],
+        os.path.abspath(audio_path), audio_stat.st_size, audio_stat.st_mtime,
+        settings, durations,
+    ])
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 2:
+        print("Usage: python run_manifest.py <run_dir>")
+        sys.exit(1)
+    manifest = RunManifest(sys.argv[1])
+    for stage in sorted(manifest.data["stages"]):
+        print(f"stage    {stage}")
+    for kind, records in sorted(manifest.data["artifacts"].items()):
+        for index, record in sorted(records.items(), key=lambda item: item[0].zfill(6)):
+            valid = manifest.artifact(kind, index) is not None
+            print(f"{kind:<8} {index:>4}  {'ok' if valid else 'stale':<5}  {record['path']}")
@@ -0,0 +1,247 @@
+# scripts/scene_timing.py
+
+import re
+import shutil
+import logging
+import subprocess
+import numpy as np
+
+try:
+    from scripts.media_probe import probe_wav
+    from scripts.instrumentation import traced
+except ImportError:
+    from media_probe import probe_wav
+    from instrumentation import traced
+
+WINDOW_SECONDS = 0.02  # Energy is measured over 20 ms windows
+CHUNK_SECONDS = 10  # Audio is read this many seconds at a time
+FFMPEG_SAMPLE_RATE = 16000
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "he", "his", "in", "is",
+    "it", "its", "of", "on", "or", "that", "the", "their", "they", "this", "to", "was", "were",
+    "will", "with", "who", "whom", "her", "she", "him", "them", "but", "not", "into", "upon",
+}
+
+def _wav_chunks(audio_path, chunk_seconds):
+    """Yields mono float32 sample blocks of a WAV file, reading at most `chunk_seconds` at a time."""
+    info = probe_wav(audio_path)
+    bits, channels, block_align = info["bits_per_sample"], info["channels"], info["block_align"]
+    if info["format_tag"] == 3 and bits == 32:
+        dtype = np.dtype('<f4')
+    elif info["format_tag"] == 1 and bits in (8, 16, 32):
+        dtype = np.dtype({8: 'u1', 16: '<i2', 32: '<i4'}[bits])
+    elif info["format_tag"] == 1 and bits == 24:
+        dtype = None
+    else:
+        raise ValueError(f"Unsupported WAV format (tag {info['format_tag']}, {bits} bits).")
+    chunk_bytes = max(1, int(info["sample_rate"] * chunk_seconds)) * block_align
+    remaining = info["data_size"] - info["data_size"] % block_align
+    with open(audio_path, 'rb') as f:
+        f.seek(info["data_offset"])
+        while remaining > 0:
+            raw = f.read(min(chunk_bytes, remaining))
+            if not raw:
+                break
+            raw = raw[:len(raw) - len(raw) % block_align]
+            remaining -= len(raw)
+            if dtype is None:
+                # 24-bit PCM: widen each little-endian triplet to a 32-bit integer
+                triplets = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+                samples = (triplets[:, 0].astype(np.int32) | (triplets[:, 1].astype(np.int32) << 8)
+                           | (triplets[:, 2].astype(np.int8).astype(np.int32) << 16))
+                scale = float(1 << 23)
+            else:
+                samples = np.frombuffer(raw, dtype=dtype)
+                if bits == 8:
+                    samples = samples.astype(np.float32) - 128.0
+                scale = 1.0 if dtype.kind == 'f' else float(1 << (bits - 1))
+            samples = samples.astype(np.float32).reshape(-1, channels).mean(axis=1) / scale
+            yield samples, info["sample_rate"]
+
+def _ffmpeg_chunks(audio_path, config, chunk_seconds):
+    """Yields mono float32 sample blocks decoded by FFmpeg through a pipe."""
+    ffmpeg_path = config.get('ffmpeg_path')
+    if not ffmpeg_path or not shutil.which(ffmpeg_path):
+        ffmpeg_path = shutil.which("ffmpeg")
+    if not ffmpeg_path:
+        raise FileNotFoundError("FFmpeg is required to analyse non-WAV audio.")
+    command = [ffmpeg_path, "-hide_banner", "-loglevel", "error", "-i", audio_path,
+               "-f", "s16le", "-ac", "1", "-ar", str(FFMPEG_SAMPLE_RATE), "-"]
+    chunk_bytes = FFMPEG_SAMPLE_RATE * chunk_seconds * 2
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            raw = process.stdout.read(chunk_bytes)
+            if not raw:
+                break
+            raw = raw[:len(raw) - len(raw) % 2]
+            yield np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0, FFMPEG_SAMPLE_RATE
+    finally:
+        process.stdout.close()
+        process.wait()
+
+def stream_rms(audio_path, config, window_seconds=WINDOW_SECONDS, chunk_seconds=CHUNK_SECONDS):
+    """
+    Computes the RMS energy of consecutive windows of the audio.
+
+    Samples are streamed chunk by chunk (WAV directly, anything else through FFmpeg),
+    so memory stays bounded by the chunk size no matter how long the narration is;
+    only one float per window is kept.
+
+    Returns:
+        numpy.ndarray: RMS energy per window.
+    """
+    chunks = _wav_chunks(audio_path, chunk_seconds) if audio_path.lower().endswith('.wav') else _ffmpeg_chunks(audio_path, config, chunk_seconds)
+    energies = []
+    carry = np.zeros(0, dtype=np.float32)
+    window = None
+    for samples, sample_rate in chunks:
+        window = window or max(1, int(sample_rate * window_seconds))
+        samples = np.concatenate((carry, samples)) if carry.size else samples
+        usable = samples.size - samples.size % window
+        if usable:
+            frames = samples[:usable].reshape(-1, window)
+            energies.append(np.sqrt(np.mean(frames * frames, axis=1)))
+        carry = samples[usable:]
+    if carry.size:
+        energies.append(np.array([np.sqrt(np.mean(carry * carry))], dtype=np.float32))
+    return np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+
+def detect_silences(energies, window_seconds=WINDOW_SECONDS, threshold_ratio=0.1, min_silence=0.2):
+    """
+    Finds pauses in the narration.
+
+    A window is silent when its energy is below `threshold_ratio` of the loud (90th
+    percentile) level; runs of at least `min_silence` seconds count as pauses.
+
+    Returns:
+        tuple: (silent_mask, pauses) where silent_mask marks windows inside a pause and
+        pauses is a list of (start, end) times in seconds.
+    """
+    if energies.size == 0:
+        return np.zeros(0, dtype=bool), []
+    threshold = max(float(np.percentile(energies, 90)) * threshold_ratio, 1e-4)
+    quiet = energies < threshold
+    # Run boundaries of the quiet mask
+    edges = np.diff(np.concatenate(([0], quiet.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    min_windows = max(1, int(round(min_silence / window_seconds)))
+    silent_mask = np.zeros_like(quiet)
+    pauses = []
+    for start, end in zip(starts, ends):
+        if end - start >= min_windows:
+            silent_mask[start:end] = True
+            pauses.append((float(start * window_seconds), float(end * window_seconds)))
+    return silent_mask, pauses
+
+def split_sentences(text):
+    """Returns (start_offset, sentence) pairs for each sentence of the transcript."""
+    return [(m.start(), m.group().strip()) for m in re.finditer(r'[^.!?]+[.!?]*', text) if m.group().strip()]
+
+def _words(text):
+    return {w for w in re.findall(r"[a-z']+", text.lower()) if w not in STOP_WORDS and len(w) > 2}
+
+def align_key_points(key_points, sentences):
+    """
+    Assigns each key point to a transcript sentence, keeping scenes in narration order.
+
+    Uses dynamic programming over word-overlap scores so the chosen sentence indices never
+    decrease, maximizing total similarity.
+
+    Returns:
+        list: Sentence index per key point.
+    """
+    if not sentences:
+        return [0] * len(key_points)
+    sentence_words = [_words(sentence) for _, sentence in sentences]
+    scores = np.array([
+        [len(_words(point) & words) / (len(_words(point) | words) or 1) for words in sentence_words]
+        for point in key_points
+    ])
+    num_points, num_sentences = scores.shape
+    best = np.zeros_like(scores)
+    choice = np.zeros(scores.shape, dtype=int)
+    best[0] = scores[0]
+    for k in range(1, num_points):
+        # Best predecessor score among sentences <= s (prefix maximum)
+        prefix_best = np.maximum.accumulate(best[k - 1])
+        prefix_arg = np.zeros(num_sentences, dtype=int)
+        for s in range(1, num_sentences):
+            prefix_arg[s] = s if best[k - 1][s] >= prefix_best[s - 1] else prefix_arg[s - 1]
+        best[k] = scores[k] + prefix_best
+        choice[k] = prefix_arg
+    assignment = [int(np.argmax(best[-1]))]
+    for k in range(num_points - 1, 0, -1):
+        assignment.append(int(choice[k][assignment[-1]]))
+    return assignment[::-1]
+
+@traced("plan_scene_durations")
+def plan_scene_durations(transcript_path, audio_path, key_points, config):
+    """
+    Plans how long each key point's image stays on screen so it matches the narration.
+
+    Key points are aligned to transcript sentences, sentence positions are mapped onto the
+    voiced (non-silent) part of the audio assuming a steady speaking rate, and each scene
+    boundary is snapped to the nearest pause within `scene_timing_snap` seconds.
+
+    Returns:
+        list: One duration in seconds per key point, or None if alignment is not possible
+        (the caller should fall back to uniform timing).
+    """
+    try:
+        with open(transcript_path, 'r', encoding='utf-8') as f:
+            transcript = f.read()
+        sentences = split_sentences(transcript)
+        if not key_points or not sentences:
+            return None
+        energies = stream_rms(audio_path, config)
+        if energies.size == 0:
+            return None
+        total = float(energies.size * WINDOW_SECONDS)
+        silent_mask, pauses = detect_silences(energies)
+
+        # Time at which a given fraction of the voiced audio has elapsed
+        voiced = np.cumsum(~silent_mask)
+        total_voiced = int(voiced[-1]) or energies.size
+
+        def voiced_time(fraction):
+            return float(np.searchsorted(voiced, fraction * total_voiced)) * WINDOW_SECONDS
+
+        assignment = align_key_points(key_points, sentences)
+        text_length = len(transcript)
+        boundaries = [0.0]
+        for k in range(1, len(key_points)):
+            sentence_idx = assignment[k]
+            start, sentence = sentences[sentence_idx]
+            # Key points sharing a sentence split it evenly
+            sharing = [j for j in range(len(key_points)) if assignment[j] == sentence_idx]
+            offset = start + len(sentence) * sharing.index(k) / len(sharing)
+            boundary = voiced_time(offset / text_length)
+            snap = float(config.get('scene_timing_snap', 1.0))
+            midpoints = [(a + b) / 2 for a, b in pauses if abs((a + b) / 2 - boundary) <= snap]
+            if midpoints:
+                boundary = min(midpoints, key=lambda m: abs(m - boundary))
+            boundaries.append(boundary)
+        boundaries.append(total)
+
+        # Keep every scene on screen for a minimum time; fall back if that is impossible
+        min_scene = float(config.get('scene_timing_min_seconds', 1.0))
+        if min_scene * len(key_points) > total:
+            return None
+        for k in range(1, len(boundaries) - 1):
+            boundaries[k] = min(max(boundaries[k], boundaries[k - 1] + min_scene), total - min_scene * (len(boundaries) - 1 - k))
+        durations = [float(end - start) for start, end in zip(boundaries, boundaries[1:])]
+        logging.info(f"Planned audio-aligned scene durations: {', '.join(f'{d:.2f}s' for d in durations)}.")
+        return durations
+    except Exception as e:
+        logging.error(f"Error planning scene timing: {e}")
+        return None
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 4:
+        print("Usage: python scene_timing.py <transcript_path> <audio_path> <key_point> [<key_point> ...]")
+        sys.exit(1)
+    durations = plan_scene_durations(sys.argv[1], sys.argv[2], sys.argv[3:], {})
+    print(durations)
@@ -1,9 +1,15 @@
 # scripts/script_processor.py
 
 import yaml
-import subprocess
 import logging
 
+try:
+    from scripts.llm_client import get_llm_client
+    from scripts.instrumentation import traced
+except ImportError:
+    from llm_client import get_llm_client
+    from instrumentation import traced
+
 def load_config(config_path):
     try:
         with open(config_path, 'r', encoding='utf-8') as f:
@@ -13,38 +19,43 @@ def load_config(config_path):
         logging.error(f"Error loading config: {e}")
         return {}
 
+def parse_analysis(output):
+    """Splits the LLM's script analysis into (key_points, characters)."""
+    key_points = []
+    characters = []
+    current_section = None
+    for line in output.split('\n'):
+        line = line.strip()
+        if line.lower().startswith('key points'):
+            current_section = 'key_points'
+            continue
+        elif line.lower().startswith('characters'):
+            current_section = 'characters'
+            continue
+        elif line.startswith('-') or line.startswith('1.') or line.startswith('*'):
+            item = line.lstrip('-*0123456789. ').strip()
+            if current_section == 'key_points':
+                key_points.append(item)
+            elif current_section == 'characters':
+                characters.append(item)
+    return key_points, characters
+
+@traced("process_script")
 def process_script(script_path, config):
     try:
         with open(script_path, 'r', encoding='utf-8') as f:
             script = f.read()
         # Use LLM to process the script
         prompt = f"Analyze the following script and list the key points and characters:\n\n{script}"
-        # Command to run Ollama with Mistral
-        command = ["ollama", "run", "hf.co/ArliAI/Mistral-Small-22B-ArliAI-RPMax-v1.1-GGUF:latest", prompt]
-        logging.info(f"Running LLM command: {' '.join(command)}")
-        result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8')  # Updated line
-        if result.returncode != 0:
-            logging.error(f"LLM command failed: {result.stderr}")
+        client = get_llm_client(config)
+        logging.info(f"Requesting LLM script analysis ({client.model}) for {script_path}")
+        # Only an analysis with key points is cached, so a useless answer is asked for again next run
+        output = client.generate(prompt, validate=lambda text: bool(parse_analysis(text)[0]))
+        if not output:
+            logging.error("LLM returned an empty analysis.")
             return [], []
-        output = result.stdout.strip()
         # Parse the output to extract key points and characters
-        key_points = []
-        characters = []
-        current_section = None
-        for line in output.split('\n'):
-            line = line.strip()
-            if line.lower().startswith('key points'):
-                current_section = 'key_points'
-                continue
-            elif line.lower().startswith('characters'):
-                current_section = 'characters'
-                continue
-            elif line.startswith('-') or line.startswith('1.') or line.startswith('*'):
-                item = line.lstrip('-*0123456789. ').strip()
-                if current_section == 'key_points':
-                    key_points.append(item)
-                elif current_section == 'characters':
-                    characters.append(item)
+        key_points, characters = parse_analysis(output)
         logging.info(f"Extracted {len(key_points)} key points and {len(characters)} characters.")
         return key_points, characters
     except Exception as e:
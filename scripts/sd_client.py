@@ -0,0 +1,604 @@
+# scripts/sd_client.py
+
+import os
+import re
+import time
+import random
+import logging
+import itertools
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from scripts.instrumentation import external_call, stage
+except ImportError:
+    from instrumentation import external_call, stage
+
+# Responses worth retrying: the WebUI restarting, a proxy in front of it, or a full queue
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def same_checkpoint(loaded, wanted):
+    """
+    True if a checkpoint title reported by the WebUI (e.g., 'sdxl.safetensors [31e35c80fc]')
+    names the checkpoint `wanted`, given as a title, file name or bare model name.
+    """
+    if not loaded or not wanted:
+        return False
+    def name(value):
+        value = re.sub(r'\s*\[[0-9a-fA-F]+\]$', '', str(value).strip())
+        value = os.path.basename(value.replace('\\', '/'))
+        return re.sub(r'\.(safetensors|ckpt)$', '', value, flags=re.I).lower()
+    return name(loaded) == name(wanted)
+
+class StableDiffusionClient:
+    """
+    Client for the AUTOMATIC1111 WebUI API (/sdapi/v1/...).
+
+    One pooled requests.Session is kept for the lifetime of the client so every render
+    reuses an open keep-alive connection. Each request has a connect and a read timeout,
+    and connection errors, timeouts and 429/5xx responses are retried with exponential
+    backoff (honouring Retry-After). At most `max_concurrency` generation requests are in
+    flight from this process; further callers queue on the limiter. Before a queued caller
+    is let through while none of ours are running, /sdapi/v1/progress is polled and the
+    caller waits as long as the server reports a job from another client.
+
+    Args:
+        api_url (str): Base URL of the WebUI (e.g., 'http://localhost:7860').
+        timeout (float): Read timeout in seconds (how long a render may take to answer).
+        connect_timeout (float): Timeout in seconds for opening the connection.
+        retries (int): Retries after the first attempt of each request.
+        backoff (float): Delay before the first retry in seconds; doubled on every retry.
+        max_backoff (float): Upper bound for a single retry delay in seconds.
+        max_concurrency (int): Generation requests allowed in flight at once.
+        busy_poll (float): Seconds between /sdapi/v1/progress polls while the server is busy.
+        max_busy_wait (float): Longest time in seconds to wait for a busy server before sending anyway.
+        pool_size (int): Maximum number of pooled connections to the server.
+    """
+
+    def __init__(self, api_url, timeout=600, connect_timeout=10, retries=3, backoff=1.0, max_backoff=30.0,
+                 max_concurrency=1, busy_poll=2.0, max_busy_wait=300, pool_size=4):
+        self.api_url = api_url.rstrip('/')
+        self.timeout = (connect_timeout, timeout)
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.busy_poll = busy_poll
+        self.max_busy_wait = max_busy_wait
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, self.max_concurrency + 1))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
+    def _retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        delay = min(self.backoff * (2 ** attempt), self.max_backoff)
+        return delay * random.uniform(0.8, 1.2)  # Jitter, so parallel callers do not retry in lockstep
+
+    def request(self, method, path, consume=None, retry_statuses=RETRY_STATUSES, **kwargs):
+        """
+        Sends a request with retries and returns consume(response), or the decoded JSON.
+        HTTP errors are retried for the statuses in `retry_statuses`.
+
+        `consume` runs inside the retry loop, so a response body that breaks off while
+        being streamed, or that `consume` rejects as truncated or malformed by raising
+        ValueError, is requested again; it must therefore tolerate being called more than
+        once. The response is always closed afterwards.
+
+        Raises:
+            requests.RequestException: When the request still fails after every retry, or
+                immediately for a non-retryable HTTP error (e.g., 404 or 422).
+        """
+        url = f"{self.api_url}{path}"
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(self.retries + 1):
+            response = None
+            try:
+                with external_call("sd", endpoint=self.api_url, path=path, attempt=attempt + 1):
+                    response = self.session.request(method, url, stream=consume is not None, **kwargs)
+                    if response.status_code in retry_statuses and attempt < self.retries:
+                        raise requests.HTTPError(f"{response.status_code} from {path}", response=response)
+                    response.raise_for_status()
+                    return consume(response) if consume else response.json()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError, requests.exceptions.ChunkedEncodingError,
+                    ValueError) as e:
+                status = e.response.status_code if getattr(e, "response", None) is not None else None
+                if attempt >= self.retries or (status is not None and status not in retry_statuses):
+                    raise
+                delay = self._retry_delay(attempt, e.response if status else None)
+                logging.warning(f"Stable Diffusion request {path} failed ({e}); retry {attempt + 1}/{self.retries} in {delay:.1f}s.")
+                time.sleep(delay)
+            finally:
+                if response is not None:
+                    response.close()
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, payload, consume=None, **kwargs):
+        return self.request("POST", path, consume=consume, json=payload, **kwargs)
+
+    def _get_once(self, path, **params):
+        # A single quick attempt, for status and listings that must not hold anything up
+        try:
+            response = self.session.get(f"{self.api_url}{path}", params=params, timeout=self.timeout[0])
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError):
+            return None
+
+    def progress(self):
+        """Returns the /sdapi/v1/progress report, or None if the server does not answer."""
+        return self._get_once("/sdapi/v1/progress", skip_current_image="true")
+
+    def list_models(self):
+        """Returns the checkpoints the server knows (/sdapi/v1/sd-models), or None if it does not answer."""
+        return self._get_once("/sdapi/v1/sd-models")
+
+    def list_loras(self):
+        """Returns the LoRAs the server knows (/sdapi/v1/loras), or None if it does not answer."""
+        return self._get_once("/sdapi/v1/loras")
+
+    def current_model(self):
+        """
+        Returns the checkpoint the server has loaded, as its title (e.g.,
+        'sd_xl_base_1.0.safetensors [31e35c80fc]'), or None if it cannot be read.
+        """
+        try:
+            options = self.get("/sdapi/v1/options")
+        except (requests.RequestException, ValueError):
+            return None
+        return options.get("sd_model_checkpoint") if isinstance(options, dict) else None
+
+    def set_model(self, model):
+        """
+        Loads a checkpoint (by title, name or file name) through /sdapi/v1/options. The
+        server answers once the weights are loaded, so this can take a while. A 500 is not
+        retried: the WebUI answers that way when the checkpoint cannot be loaded.
+        """
+        self.post("/sdapi/v1/options", {"sd_model_checkpoint": model}, retry_statuses=RETRY_STATUSES - {500})
+
+    def resolve_model(self, model):
+        """
+        Returns the title of the server's checkpoint named `model` (a title, file name or bare
+        model name, as matched by same_checkpoint), '' if the server has no such checkpoint,
+        or None if it does not list its checkpoints.
+        """
+        models = self.list_models()
+        if not isinstance(models, list):
+            return None
+        for item in models:
+            if not isinstance(item, dict):
+                continue
+            names = (item.get("title"), item.get("model_name"), item.get("filename"))
+            if any(same_checkpoint(name, model) for name in names if name):
+                return item.get("title") or item.get("model_name")
+        return ""
+
+    def is_busy(self):
+        """True if the server reports a generation job in progress."""
+        report = self.progress()
+        if not report:
+            return False
+        state = report.get("state") or {}
+        return bool(state.get("job_count", 0)) or float(report.get("progress") or 0) > 0
+
+    def _wait_until_idle(self):
+        # Only jobs from other clients count; our own are already bounded by the limiter
+        if self.max_busy_wait <= 0:
+            return
+        waited = 0.0
+        while self._in_flight == 0 and self.is_busy():
+            if waited >= self.max_busy_wait:
+                logging.warning(f"Stable Diffusion server still busy after {waited:.1f}s; sending the request anyway.")
+                return
+            if waited == 0:
+                logging.info("Stable Diffusion server is busy with another client; waiting for it to finish.")
+            time.sleep(self.busy_poll)
+            waited += self.busy_poll
+
+    def generate(self, path, payload, consume=None):
+        """
+        Sends a generation request (e.g., /sdapi/v1/txt2img) through the concurrency limiter,
+        waiting for a busy server first. Arguments and result are as for request().
+        """
+        queued = time.perf_counter()
+        with self._slots:
+            waited = time.perf_counter() - queued
+            if waited > 1:
+                logging.info(f"Waited {waited:.1f}s for a free Stable Diffusion slot.")
+            self._wait_until_idle()
+            with self._in_flight_lock:
+                self._in_flight += 1
+            try:
+                return self.post(path, payload, consume=consume)
+            finally:
+                with self._in_flight_lock:
+                    self._in_flight -= 1
+
+    def txt2img(self, payload, consume=None):
+        return self.generate("/sdapi/v1/txt2img", payload, consume=consume)
+
+    def close(self):
+        self.session.close()
+
+class _Node:
+    """Dispatcher bookkeeping for one endpoint."""
+
+    def __init__(self, client, capacity):
+        self.client = client
+        self.capacity = capacity
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = None  # Moving average of request seconds
+        self.down_until = 0.0
+        self.loaded_model = None  # Checkpoint the server has loaded (None: not known yet)
+        self.loading = None  # Checkpoint a caller is loading; no new requests until it is done
+        self.group_served = 0  # Requests served since the checkpoint was loaded
+        self.swaps = 0
+        self.swap_seconds = 0.0
+        self.unswitchable = set()  # Checkpoints the server refused to load
+
+    def healthy(self, now):
+        return now >= self.down_until
+
+    def serves(self, model):
+        current = self.loading or self.loaded_model
+        return model is None or (current is not None and same_checkpoint(current, model))
+
+    def swap_cost(self):
+        return self.swap_seconds / self.swaps if self.swaps else None
+
+class StableDiffusionDispatcher:
+    """
+    Distributes generation requests over one or more AUTOMATIC1111 endpoints.
+
+    Each request goes to the healthy endpoint with the fewest outstanding requests
+    relative to its capacity (`max_concurrency`), the fastest recent average latency
+    breaking ties. Callers wait when every endpoint is at capacity. An endpoint whose
+    request still fails after its client's retries is taken out of rotation for a
+    cooldown (doubling with each consecutive failure, up to `max_cooldown`), and the
+    request fails over to the next endpoint; once the cooldown ends it rejoins and
+    receives new work again. When every endpoint is down, the one that comes back
+    soonest is tried anyway, so a single-endpoint setup still retries each render.
+
+    Requests that name a checkpoint (payload 'model') are scheduled so each endpoint swaps
+    weights as rarely as possible. A request only goes to an endpoint that already has its
+    checkpoint loaded; an endpoint switches (via /sdapi/v1/options) only once it is idle and
+    no waiting request wants its current checkpoint, and then to the checkpoint with the
+    most waiting requests. Waiting requests from every caller (e.g., every job rendering
+    at once) are therefore drained checkpoint by checkpoint. `max_group_run` bounds how many
+    requests one checkpoint may serve while others wait, so a steady stream for one model
+    cannot starve the rest. Every swap is counted, timed and written to the run trace.
+
+    Args:
+        clients (list): (StableDiffusionClient, max_concurrency) per endpoint.
+        cooldown (float): Seconds a failed endpoint sits out at first.
+        max_cooldown (float): Longest cooldown in seconds.
+        max_group_run (int): Requests one checkpoint may serve while others wait (0: no limit).
+    """
+
+    LATENCY_SMOOTHING = 0.3  # Weight of the newest sample in the moving average
+
+    def __init__(self, clients, cooldown=30.0, max_cooldown=600.0, max_group_run=0):
+        self.nodes = [_Node(client, max(1, int(capacity))) for client, capacity in clients]
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_group_run = max(0, int(max_group_run))
+        self.swap_log = []  # One dict per checkpoint swap: endpoint, from_model, to_model, seconds, time
+        self._condition = threading.Condition()
+        self._waiting = []  # (ticket, model) of every caller waiting in _acquire, oldest first
+        self._tickets = itertools.count()
+
+    @property
+    def capacity(self):
+        """Requests that can be in flight across every endpoint at once."""
+        return sum(node.capacity for node in self.nodes)
+
+    def _next_model(self):
+        # The checkpoint an idle endpoint should switch to: first those no endpoint has loaded,
+        # then the one with the most waiting requests, the longest waiting one breaking ties
+        counts, oldest = {}, {}
+        for ticket, model in self._waiting:
+            if model is not None:
+                counts[model] = counts.get(model, 0) + 1
+                oldest.setdefault(model, ticket)
+        if not counts:
+            return None
+        now = time.monotonic()
+        return min(counts, key=lambda model: (
+            any(node.healthy(now) and node.serves(model) for node in self.nodes), -counts[model], oldest[model]
+        ))
+
+    def _exhausted(self, node):
+        # The node's checkpoint has served its run while requests for other checkpoints wait
+        return bool(self.max_group_run) and node.group_served >= self.max_group_run and any(
+            model is not None and not node.serves(model) for _, model in self._waiting
+        )
+
+    def _can_switch(self, node):
+        if node.outstanding:
+            return False
+        if node.loaded_model is None or self._exhausted(node):
+            return True
+        return not any(model is not None and node.serves(model) for _, model in self._waiting)
+
+    def _worth_helping(self, node, model):
+        # Loading a checkpoint another endpoint already serves only pays off when its backlog
+        # there would take longer than the swap (estimated from earlier swaps)
+        now = time.monotonic()
+        serving = [n for n in self.nodes if n is not node and n.healthy(now) and n.serves(model)]
+        if not serving:
+            return True
+        swap_costs = [n.swap_cost() for n in [node] + self.nodes if n.swap_cost() is not None]
+        if not swap_costs:
+            return False
+        waiting = sum(1 for _, wanted in self._waiting if wanted is not None and same_checkpoint(wanted, model))
+        latency = max((n.latency or 0.0) for n in serving)
+        return waiting * latency / sum(n.capacity for n in serving) > swap_costs[0]
+
+    def _acquire(self, exclude, model=None):
+        # Returns (node, switch): switch is True when the caller must load `model` on the node first
+        with self._condition:
+            waiter = (next(self._tickets), model)
+            self._waiting.append(waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    candidates = [node for node in self.nodes if node not in exclude]
+                    if not candidates:
+                        return None, False
+                    healthy = [node for node in candidates if node.healthy(now)]
+                    if not healthy:
+                        healthy = [min(candidates, key=lambda node: node.down_until)]
+                    free = [node for node in healthy if node.outstanding < node.capacity and node.loading is None]
+                    ready = [node for node in free if node.serves(model) and (model is None or not self._exhausted(node))]
+                    if ready:
+                        node = min(ready, key=lambda node: (node.outstanding / node.capacity, node.latency or 0.0))
+                        node.outstanding += 1
+                        node.group_served += 1
+                        return node, False
+                    if free and self._next_model() == model:
+                        idle = [node for node in free if self._can_switch(node)]
+                        idle = [node for node in idle if self._worth_helping(node, model)]
+                        if idle:
+                            node = min(idle, key=lambda node: (node.loaded_model is not None, node.latency or 0.0))
+                            node.outstanding += 1
+                            node.loading = model
+                            return node, True
+                    self._condition.wait(timeout=1.0)
+            finally:
+                self._waiting.remove(waiter)
+
+    def _switch(self, node, model):
+        """Loads `model` on the node's server unless it is already loaded there."""
+        url = node.client.api_url
+        previous, loaded = node.loaded_model, None
+        try:
+            # A checkpoint the server refused is only nominally loaded; ask for the real one
+            current = previous if previous and previous not in node.unswitchable else node.client.current_model()
+            if same_checkpoint(current, model) or model in node.unswitchable:
+                loaded = current if same_checkpoint(current, model) else model
+                return
+            title = node.client.resolve_model(model)
+            if title == "":
+                # Checkpoint unknown to the server: render with what it has, as before
+                logging.warning(f"{url} has no checkpoint named '{model}'; rendering with the checkpoint it has loaded.")
+                node.unswitchable.add(model)
+                loaded = model
+                return
+            title = title or model  # Server does not list its checkpoints: try the name as given
+            logging.info(f"Loading checkpoint '{title}' on {url} (was '{current or 'unknown'}').")
+            started = time.perf_counter()
+            try:
+                with stage("model_swap", endpoint=url, from_model=current, to_model=title):
+                    node.client.set_model(title)
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status is None or (status in RETRY_STATUSES and status != 500):
+                    raise
+                # The WebUI answers 4xx or 500 when it cannot load the checkpoint; the server itself is fine
+                logging.warning(f"{url} could not load checkpoint '{title}' ({e}); rendering with the checkpoint it has loaded.")
+                node.unswitchable.add(model)
+                loaded = model
+                return
+            seconds = time.perf_counter() - started
+            loaded = model
+            with self._condition:
+                node.swaps += 1
+                node.swap_seconds += seconds
+                self.swap_log.append({
+                    "endpoint": url, "from_model": current, "to_model": title, "seconds": seconds, "time": time.time(),
+                })
+            logging.info(f"Checkpoint '{title}' loaded on {url} in {seconds:.2f}s.")
+        finally:
+            with self._condition:
+                node.loading = None
+                node.loaded_model = loaded  # None after a failure: read it again next time
+                node.group_served = 1
+                self._condition.notify_all()
+
+    def _release(self, node, seconds, error=None):
+        with self._condition:
+            node.outstanding -= 1
+            node.requests += 1
+            if error is None:
+                node.consecutive_failures = 0
+                node.down_until = 0.0
+                if node.latency is None:
+                    node.latency = seconds
+                else:
+                    node.latency += self.LATENCY_SMOOTHING * (seconds - node.latency)
+            else:
+                node.failures += 1
+                node.consecutive_failures += 1
+                cooldown = min(self.cooldown * 2 ** (node.consecutive_failures - 1), self.max_cooldown)
+                node.down_until = time.monotonic() + cooldown
+                logging.warning(f"Stable Diffusion endpoint {node.client.api_url} failed ({error}); "
+                                f"out of rotation for {cooldown:.0f}s.")
+            self._condition.notify_all()
+
+    def generate(self, path, payload, consume=None):
+        """
+        Sends a generation request to the least loaded healthy endpoint that has the payload's
+        checkpoint loaded (switching one when none has), failing over to the others if it
+        fails. Arguments and result are as for StableDiffusionClient.request().
+        """
+        model = payload.get("model")
+        tried = []
+        last_error = None
+        while True:
+            node, switch = self._acquire(tried, model)
+            if node is None:
+                raise last_error
+            tried.append(node)
+            started = time.perf_counter()
+            try:
+                if switch:
+                    self._switch(node, model)
+                result = node.client.generate(path, payload, consume=consume)
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status is not None and status not in RETRY_STATUSES:
+                    self._release(node, time.perf_counter() - started)
+                    raise  # The request itself is invalid; another endpoint would reject it too
+                self._release(node, time.perf_counter() - started, e)
+                last_error = e
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError, ValueError) as e:
+                self._release(node, time.perf_counter() - started, e)
+                last_error = e
+            except BaseException:
+                self._release(node, time.perf_counter() - started)
+                raise
+            else:
+                self._release(node, time.perf_counter() - started)
+                return result
+            if len(self.nodes) > len(tried):
+                logging.info(f"Retrying the request on another Stable Diffusion endpoint ({len(tried)}/{len(self.nodes)} tried).")
+
+    def txt2img(self, payload, consume=None):
+        return self.generate("/sdapi/v1/txt2img", payload, consume=consume)
+
+    def loaded_models(self):
+        """Returns the checkpoint each endpoint has loaded (None where not known yet), by URL."""
+        with self._condition:
+            return {node.client.api_url: node.loaded_model for node in self.nodes}
+
+    def swap_history(self, start=0):
+        """Returns copies of the swap_log entries from position `start` on."""
+        with self._condition:
+            return [dict(swap) for swap in self.swap_log[start:]]
+
+    def stats(self):
+        """
+        Returns one dict per endpoint: url, capacity, outstanding, requests, failures, latency,
+        healthy, model, swaps, swap_seconds.
+        """
+        now = time.monotonic()
+        with self._condition:
+            return [{
+                "url": node.client.api_url,
+                "capacity": node.capacity,
+                "outstanding": node.outstanding,
+                "requests": node.requests,
+                "failures": node.failures,
+                "latency": node.latency,
+                "healthy": node.healthy(now),
+                "model": node.loaded_model,
+                "swaps": node.swaps,
+                "swap_seconds": node.swap_seconds,
+            } for node in self.nodes]
+
+    def log_stats(self):
+        for entry in self.stats():
+            latency = f"{entry['latency']:.2f}s" if entry['latency'] is not None else "n/a"
+            logging.info(
+                f"Stable Diffusion endpoint {entry['url']}: {entry['requests']} requests, {entry['failures']} failed, "
+                f"average latency {latency}, {entry['swaps']} checkpoint swaps ({entry['swap_seconds']:.1f}s), "
+                f"{'healthy' if entry['healthy'] else 'out of rotation'}."
+            )
+
+    def close(self):
+        for node in self.nodes:
+            node.client.close()
+
+def get_endpoints(config):
+    """
+    Returns (url, max_concurrency) for every configured endpoint. `automatic1111_api` is a
+    URL or a list whose entries are URLs or {url, max_concurrency} mappings; entries
+    without their own limit use `sd_max_concurrency`.
+    """
+    entries = config['automatic1111_api']
+    if not isinstance(entries, (list, tuple)):
+        entries = [entries]
+    default = int(config.get('sd_max_concurrency', 1))
+    endpoints = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            endpoints.append((str(entry['url']).rstrip('/'), int(entry.get('max_concurrency', default))))
+        else:
+            endpoints.append((str(entry).rstrip('/'), default))
+    return endpoints
+
+_dispatchers = {}
+_dispatchers_lock = threading.Lock()
+
+def get_sd_client(config):
+    """
+    Returns the shared StableDiffusionDispatcher for the configured endpoints, creating it
+    on first use, so every render in a process shares the connection pools, concurrency
+    limits and endpoint health.
+    """
+    endpoints = tuple(get_endpoints(config))
+    settings = (
+        float(config.get('sd_timeout', 600)),
+        float(config.get('sd_connect_timeout', 10)),
+        int(config.get('sd_retries', 3)),
+        float(config.get('sd_retry_backoff', 1.0)),
+        float(config.get('sd_busy_poll', 2.0)),
+        float(config.get('sd_max_busy_wait', 300)),
+        float(config.get('sd_node_cooldown', 30)),
+        int(config.get('sd_max_group_run', 0)),
+    )
+    key = (endpoints, settings)
+    with _dispatchers_lock:
+        dispatcher = _dispatchers.get(key)
+        if dispatcher is None:
+            timeout, connect_timeout, retries, backoff, busy_poll, max_busy_wait, cooldown, max_group_run = settings
+            clients = [(StableDiffusionClient(
+                url,
+                timeout=timeout,
+                connect_timeout=connect_timeout,
+                retries=retries,
+                backoff=backoff,
+                max_concurrency=max_concurrency,
+                busy_poll=busy_poll,
+                max_busy_wait=max_busy_wait,
+            ), max_concurrency) for url, max_concurrency in endpoints]
+            dispatcher = StableDiffusionDispatcher(clients, cooldown=cooldown, max_group_run=max_group_run)
+            _dispatchers[key] = dispatcher
+            logging.info(
+                f"Created Stable Diffusion dispatcher for {', '.join(url for url, _ in endpoints)} "
+                f"({dispatcher.capacity} concurrent requests)."
+            )
+        return dispatcher
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 2:
+        print("Usage: python sd_client.py <automatic1111_api>")
+        sys.exit(1)
+    client = StableDiffusionClient(sys.argv[1])
+    print(f"Loaded checkpoint: {client.current_model()}")
+    print(client.progress())
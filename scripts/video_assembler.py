@@ -1,9 +1,58 @@
 # scripts/video_assembler.py
 
 import yaml
+import numpy as np
+from PIL import Image, ImageOps
 from moviepy.editor import ImageClip, AudioFileClip, concatenate_videoclips
 import logging
 import os
+import time
+import shutil
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from scripts.media_probe import probe_duration
+    from scripts.instrumentation import external_call, traced
+except ImportError:
+    from media_probe import probe_duration
+    from instrumentation import external_call, traced
+
+# Audio formats MP4 can carry without re-encoding
+COPYABLE_AUDIO_EXTENSIONS = ('.m4a', '.aac', '.mp3')
+
+# Used for any setting a profile leaves out; 1080x1920 is the YouTube Shorts frame
+DEFAULT_ENCODING_PROFILE = {
+    "width": 1080,
+    "height": 1920,
+    "fps": 30,
+    "preset": "medium",
+    "crf": 20,
+    "tune": "stillimage",
+    "threads": 0,  # 0 lets x264 pick one thread per core
+}
+
+# Defaults for the `motion` config section (Ken Burns zoom/pan on each still)
+DEFAULT_MOTION = {
+    "enabled": False,
+    "zoom": 1.15,  # Largest zoom factor reached within a scene
+    "pattern": ["zoom_in", "pan_right", "zoom_out", "pan_left"],  # Cycled scene by scene
+    "resample": "bilinear",
+    "workers": 0,  # Frame rendering threads (0 uses every core)
+}
+
+# Defaults for the `transition` config section
+DEFAULT_TRANSITION = {
+    "type": "none",  # 'none', 'crossfade' or 'slide'
+    "duration": 0.5,  # Seconds, centred on each scene cut
+}
+
+RESAMPLE_FILTERS = {
+    "nearest": Image.NEAREST,
+    "bilinear": Image.BILINEAR,
+    "bicubic": Image.BICUBIC,
+}
 
 def load_config(config_path):
     try:
@@ -14,23 +63,389 @@ def load_config(config_path):
         logging.error(f"Error loading config: {e}")
         return {}
 
-def assemble_video(image_paths, audio_path, output_path, config):
+def resolve_ffmpeg(config):
+    """Returns the configured `ffmpeg_path` if it exists, otherwise ffmpeg from PATH."""
+    ffmpeg_path = config.get('ffmpeg_path')
+    if ffmpeg_path and os.path.isfile(ffmpeg_path):
+        return ffmpeg_path
+    fallback = shutil.which("ffmpeg")
+    if not fallback:
+        raise FileNotFoundError(f"FFmpeg not found at '{ffmpeg_path}' or on PATH.")
+    logging.warning(f"FFmpeg not found at '{ffmpeg_path}'; using {fallback}.")
+    return fallback
+
+def get_encoding_profile(config, name=None):
+    """
+    Returns the encoding settings for `name` (or `encoding_profile` from the config),
+    filled in with DEFAULT_ENCODING_PROFILE for anything the profile leaves out.
+    """
+    name = name or config.get('encoding_profile', 'shorts')
+    profiles = config.get('encoding_profiles') or {}
+    if name not in profiles:
+        logging.warning(f"Encoding profile '{name}' not found in config; using defaults.")
+    return {**DEFAULT_ENCODING_PROFILE, **(profiles.get(name) or {})}
+
+def _x264_params(profile):
+    params = ["-crf", str(profile["crf"])]
+    if profile.get("tune"):
+        params += ["-tune", str(profile["tune"])]
+    return params
+
+def _scene_durations(image_paths, duration, durations=None):
+    """
+    Returns the on-screen time of each image: `durations` rescaled to the exact audio
+    length when given, otherwise `duration / num_images` for every image.
+    """
+    if durations and len(durations) == len(image_paths) and sum(durations) > 0:
+        scale = duration / sum(durations)
+        return [d * scale for d in durations]
+    if durations:
+        logging.warning(f"Ignoring {len(durations)} scene durations for {len(image_paths)} images; using uniform timing.")
+    return [duration / len(image_paths)] * len(image_paths)
+
+def _concat_entry(path):
+    # The concat demuxer quotes paths with single quotes; embedded quotes are escaped as '\''
+    escaped = os.path.abspath(path).replace("\\", "/").replace("'", "'\\''")
+    return f"file '{escaped}'\n"
+
+def _assemble_with_ffmpeg(image_paths, audio_path, output_path, config, durations=None):
+    """
+    Encodes the slideshow by driving ffmpeg directly with the concat demuxer.
+
+    Each still is decoded once, letterboxed to the profile's frame size and shown for
+    its scene duration, the same timing as the MoviePy engine, without
+    compositing frames in Python. Audio that MP4 can carry as-is (AAC, MP3) is copied
+    instead of re-encoded.
+    """
+    profile = get_encoding_profile(config)
+    width, height = profile["width"], profile["height"]
+    ffmpeg_path = resolve_ffmpeg(config)
+    duration = probe_duration(audio_path, config)
+    clip_durations = _scene_durations(image_paths, duration, durations)
+    list_file = tempfile.NamedTemporaryFile('w', suffix=".txt", delete=False, encoding='utf-8')
+    try:
+        with list_file:
+            for img_path, clip_duration in zip(image_paths, clip_durations):
+                list_file.write(_concat_entry(img_path))
+                list_file.write(f"duration {clip_duration:.6f}\n")
+            # The demuxer ignores the last entry's duration unless the file is listed again
+            list_file.write(_concat_entry(image_paths[-1]))
+        audio_ext = os.path.splitext(audio_path)[1].lower()
+        audio_codec = ["-c:a", "copy"] if audio_ext in COPYABLE_AUDIO_EXTENSIONS else ["-c:a", "aac"]
+        command = [
+            ffmpeg_path, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "concat", "-safe", "0", "-i", list_file.name,
+            "-i", audio_path,
+            "-map", "0:v:0", "-map", "1:a:0",
+            "-vf", (
+                f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,format=yuv420p"
+            ),
+            "-r", str(profile["fps"]),
+            "-c:v", "libx264",
+            "-preset", str(profile["preset"]),
+            *_x264_params(profile),
+            "-threads", str(profile["threads"]),
+            *audio_codec,
+            "-t", f"{duration:.6f}",
+            "-movflags", "+faststart",
+            output_path,
+        ]
+        logging.info(f"Running FFmpeg assembly: {' '.join(command)}")
+        with external_call("ffmpeg", engine="concat"):
+            result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', errors='replace')
+        if result.returncode != 0:
+            raise RuntimeError(f"FFmpeg exited with code {result.returncode}: {result.stderr.strip()[-2000:]}")
+    finally:
+        os.remove(list_file.name)
+
+def _letterbox(img_path, width, height):
+    # Fit the still inside the frame once up front, so MoviePy never resizes per frame; scaled up
+    # or down like ffmpeg's scale=...:force_original_aspect_ratio=decrease,pad=...
+    with Image.open(img_path) as image:
+        image = ImageOps.contain(image.convert("RGB"), (width, height), Image.LANCZOS)
+        frame = Image.new("RGB", (width, height))
+        frame.paste(image, ((width - image.width) // 2, (height - image.height) // 2))
+    return np.asarray(frame)
+
+def _assemble_with_moviepy(image_paths, audio_path, output_path, config, durations=None):
+    profile = get_encoding_profile(config)
+    # Plan scene timing from the header; the audio itself is only read once, while muxing
+    duration = probe_duration(audio_path, config)
+    clip_durations = _scene_durations(image_paths, duration, durations)
+    clips = []
+    for img_path, clip_duration in zip(image_paths, clip_durations):
+        clip = ImageClip(_letterbox(img_path, profile["width"], profile["height"])).set_duration(clip_duration)
+        clips.append(clip)
+    video = concatenate_videoclips(clips, method="compose")
+    video = video.set_audio(AudioFileClip(audio_path))
+    with external_call("ffmpeg", engine="moviepy"):
+        video.write_videofile(
+            output_path,
+            codec="libx264",
+            audio_codec="aac",
+            fps=profile["fps"],
+            preset=profile["preset"],
+            threads=profile["threads"] or os.cpu_count(),
+            ffmpeg_params=_x264_params(profile) + ["-pix_fmt", "yuv420p"],
+        )
+
+def get_motion_settings(config):
+    """Returns the `motion` config section filled in with DEFAULT_MOTION."""
+    return {**DEFAULT_MOTION, **(config.get('motion') or {})}
+
+def _frame_counts(clip_durations, fps):
+    # Round cumulative times rather than each scene, so rounding never drifts from the audio
+    boundaries = np.rint(np.cumsum([0.0] + list(clip_durations)) * fps).astype(int)
+    return np.diff(boundaries).tolist()
+
+def motion_boxes(num_frames, width, height, zoom, move):
+    """
+    Computes the source crop box of every frame of one scene in a single vectorized pass.
+
+    Boxes are in the coordinates of a still letterboxed at `zoom` times the frame size,
+    so every crop is downscaled (never upscaled) to the output frame. Movement follows a
+    smoothstep ease so scenes start and end at rest.
+
+    Args:
+        num_frames (int): Frames in the scene.
+        width (int): Output frame width.
+        height (int): Output frame height.
+        zoom (float): Largest zoom factor (1.0 disables motion).
+        move (str): 'zoom_in', 'zoom_out', 'pan_left' or 'pan_right'.
+
+    Returns:
+        numpy.ndarray: (num_frames, 4) float array of (left, top, right, bottom) boxes.
+    """
+    t = (np.arange(num_frames) + 0.5) / max(num_frames, 1)
+    ease = t * t * (3 - 2 * t)
+    source_w, source_h = width * zoom, height * zoom
+    if move in ("zoom_in", "zoom_out"):
+        progress = ease if move == "zoom_in" else 1 - ease
+        scale = 1 + (zoom - 1) * progress
+        box_w, box_h = source_w / scale, source_h / scale
+        center_x = np.full(num_frames, source_w / 2)
+    elif move in ("pan_left", "pan_right"):
+        # Pan across the still at full zoom, i.e., over a window the size of the output frame
+        box_w, box_h = np.full(num_frames, float(width)), np.full(num_frames, float(height))
+        progress = ease if move == "pan_right" else 1 - ease
+        center_x = width / 2 + (source_w - width) * progress
+    else:
+        raise ValueError(f"Unknown motion '{move}'.")
+    center_y = source_h / 2
+    return np.stack([center_x - box_w / 2, center_y - box_h / 2, center_x + box_w / 2, center_y + box_h / 2], axis=1)
+
+def motion_frames(image_path, num_frames, width, height, motion, scene_idx=0, executor=None, window=8):
+    """
+    Yields the frames of one scene with Ken Burns motion as RGB byte strings.
+
+    The still is decoded and letterboxed once; each frame is then a single resize of a
+    precomputed crop box, which PIL runs in C with the GIL released, so frames render in
+    parallel on `executor` threads, at most `window` frames at a time to bound memory.
+    """
+    zoom = max(1.0, float(motion["zoom"]))
+    pattern = motion["pattern"] or ["zoom_in"]
+    move = pattern[scene_idx % len(pattern)]
+    resample = RESAMPLE_FILTERS.get(motion["resample"], Image.BILINEAR)
+    source = Image.fromarray(_letterbox(image_path, round(width * zoom), round(height * zoom)))
+    boxes = motion_boxes(num_frames, width, height, zoom, move)
+
+    def render(box):
+        return source.resize((width, height), resample, box=tuple(box)).tobytes()
+
+    if executor is None:
+        for box in boxes:
+            yield render(box)
+        return
+    for start in range(0, num_frames, window):
+        yield from executor.map(render, boxes[start:start + window])
+
+def _open_raw_encoder(ffmpeg_path, audio_path, output_path, profile, duration, tune=True):
+    """Starts ffmpeg reading raw RGB frames from stdin and muxing them with the audio."""
+    audio_ext = os.path.splitext(audio_path)[1].lower()
+    audio_codec = ["-c:a", "copy"] if audio_ext in COPYABLE_AUDIO_EXTENSIONS else ["-c:a", "aac"]
+    video_params = _x264_params(profile if tune else {**profile, "tune": None})
+    command = [
+        ffmpeg_path, "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{profile['width']}x{profile['height']}",
+        "-r", str(profile["fps"]), "-i", "-",
+        "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c:v", "libx264",
+        "-preset", str(profile["preset"]),
+        *video_params,
+        "-pix_fmt", "yuv420p",
+        "-threads", str(profile["threads"]),
+        *audio_codec,
+        "-t", f"{duration:.6f}",
+        "-movflags", "+faststart",
+        output_path,
+    ]
+    logging.info(f"Running FFmpeg raw-frame encoder: {' '.join(command)}")
+    return subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+def _stream_frames(encoder, frames):
+    """Writes frames to the encoder's stdin and waits for it, raising if ffmpeg fails."""
+    written = 0
+    try:
+        for frame in frames:
+            encoder.stdin.write(frame)
+            written += 1
+    except BrokenPipeError:
+        pass  # ffmpeg exited early; its error is reported below
+    finally:
+        try:
+            encoder.stdin.close()
+        except BrokenPipeError:
+            pass
+    stderr = encoder.stderr.read().decode('utf-8', errors='replace')
+    encoder.stderr.close()
+    if encoder.wait() != 0:
+        raise RuntimeError(f"FFmpeg exited with code {encoder.returncode}: {stderr.strip()[-2000:]}")
+    return written
+
+def get_transition_settings(config):
+    """Returns the `transition` config section filled in with DEFAULT_TRANSITION."""
+    return {**DEFAULT_TRANSITION, **(config.get('transition') or {})}
+
+def _still_frames(image_path, num_frames, width, height):
+    # A static scene is one letterboxed frame; the same buffer is written for every frame
+    frame = _letterbox(image_path, width, height).tobytes()
+    for _ in range(num_frames):
+        yield frame
+
+def composite_transition(outgoing, incoming, progress, kind):
+    """
+    Builds one transition frame from the outgoing and incoming scenes' frames.
+
+    Args:
+        outgoing (numpy.ndarray): (height, width, 3) uint8 frame of the scene being left.
+        incoming (numpy.ndarray): Frame of the next scene, same shape.
+        progress (float): 0.0 (all outgoing) to 1.0 (all incoming).
+        kind (str): 'crossfade' or 'slide' (the incoming scene pushes the outgoing one left).
+
+    Returns:
+        numpy.ndarray: The composited frame.
+    """
+    if kind == "crossfade":
+        # Integer blend in 1/256 steps avoids float conversion of the whole frame
+        weight = int(round(progress * 256))
+        blended = outgoing.astype(np.uint16) * (256 - weight) + incoming.astype(np.uint16) * weight
+        return (blended >> 8).astype(np.uint8)
+    if kind == "slide":
+        width = outgoing.shape[1]
+        offset = int(round(progress * progress * (3 - 2 * progress) * width))
+        frame = np.empty_like(outgoing)
+        frame[:, :width - offset] = outgoing[:, offset:]
+        frame[:, width - offset:] = incoming[:, :offset]
+        return frame
+    raise ValueError(f"Unknown transition '{kind}'.")
+
+def _transition_overlaps(frame_counts, transition_frames):
+    # Frames each boundary borrows from both neighbours; short scenes get shorter transitions
+    return [
+        min(transition_frames // 2, frame_counts[i] // 2, frame_counts[i + 1] // 2)
+        for i in range(len(frame_counts) - 1)
+    ]
+
+def _assemble_with_frames(image_paths, audio_path, output_path, config, durations=None):
+    """
+    Encodes the slideshow by streaming generated frames into ffmpeg, for Ken Burns motion
+    and/or transitions between scenes.
+
+    Frames never touch the disk and never pass through MoviePy: each scene's crop boxes
+    are precomputed with NumPy, frames are rendered on a thread pool and piped as raw RGB
+    to an ffmpeg process that encodes while the next frames are produced.
+
+    A transition of 2h frames is centred on each scene boundary: the outgoing scene runs h
+    frames past the cut and the incoming one starts h frames early (its motion continues
+    smoothly through the overlap). Only those overlapping frames are composited; every
+    other frame is written exactly as its scene produced it.
+    """
+    profile = get_encoding_profile(config)
+    motion = get_motion_settings(config)
+    transition = get_transition_settings(config)
+    width, height, fps = profile["width"], profile["height"], profile["fps"]
+    ffmpeg_path = resolve_ffmpeg(config)
+    duration = probe_duration(audio_path, config)
+    frame_counts = _frame_counts(_scene_durations(image_paths, duration, durations), fps)
+    workers = int(motion["workers"]) or os.cpu_count() or 1
+    kind = transition["type"]
+    transition_frames = int(round(float(transition["duration"]) * fps)) if kind != "none" else 0
+    overlaps = _transition_overlaps(frame_counts, transition_frames)
+    composited = 0
+
+    # The stillimage tune assumes a static picture, which no longer holds once frames move
+    encoder = _open_raw_encoder(ffmpeg_path, audio_path, output_path, profile, duration,
+                                tune=not motion["enabled"] or profile.get("tune") != "stillimage")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def scene(scene_idx):
+            lead = overlaps[scene_idx - 1] if scene_idx > 0 else 0
+            tail = overlaps[scene_idx] if scene_idx < len(overlaps) else 0
+            num_frames = lead + frame_counts[scene_idx] + tail
+            if motion["enabled"]:
+                return motion_frames(image_paths[scene_idx], num_frames, width, height, motion,
+                                     scene_idx, executor, workers * 2)
+            return _still_frames(image_paths[scene_idx], num_frames, width, height)
+
+        def frames():
+            nonlocal composited
+            current = scene(0)
+            lead = 0  # Frames of the current scene shown during the transition into it
+            for scene_idx in range(len(image_paths)):
+                half = overlaps[scene_idx] if scene_idx < len(overlaps) else 0
+                for _ in range(frame_counts[scene_idx] - lead - half):
+                    yield next(current)
+                if scene_idx == len(image_paths) - 1:
+                    break
+                incoming = scene(scene_idx + 1)
+                span = 2 * half
+                for i in range(span):
+                    outgoing_frame = np.frombuffer(next(current), dtype=np.uint8).reshape(height, width, 3)
+                    incoming_frame = np.frombuffer(next(incoming), dtype=np.uint8).reshape(height, width, 3)
+                    yield composite_transition(outgoing_frame, incoming_frame, (i + 0.5) / span, kind).tobytes()
+                composited += span
+                current, lead = incoming, half
+
+        started = time.perf_counter()
+        # The encoder runs for as long as frames are produced, so this includes rendering them
+        with external_call("ffmpeg", engine="frame_stream"):
+            written = _stream_frames(encoder, frames())
+    elapsed = time.perf_counter() - started
+    logging.info(
+        f"Streamed {written} frames ({composited} composited for '{kind}' transitions) in {elapsed:.2f}s "
+        f"({written / max(elapsed, 1e-9):.1f} fps)."
+    )
+
+@traced("assemble_video", hot=True)
+def assemble_video(image_paths, audio_path, output_path, config, durations=None):
+    """
+    Assembles images into a video synchronized with the audio.
+
+    The encoder is chosen by `video_engine` in the config: 'moviepy' (default) composites
+    clips through MoviePy, 'ffmpeg' drives the configured FFmpeg binary directly.
+    When `motion.enabled` is set or a `transition` type is configured, frames are
+    generated and streamed straight into FFmpeg instead, whichever engine is configured.
+    `durations` optionally gives each image's on-screen time (e.g., from
+    scene_timing.plan_scene_durations); by default the audio is split evenly.
+    """
     try:
-        audio = AudioFileClip(audio_path)
-        duration = audio.duration
         num_images = len(image_paths)
         if num_images == 0:
             logging.error("No images provided for video assembly.")
             return None
-        clip_duration = duration / num_images
-        clips = []
-        for img_path in image_paths:
-            clip = ImageClip(img_path).set_duration(clip_duration)
-            clips.append(clip)
-        video = concatenate_videoclips(clips, method="compose")
-        video = video.set_audio(audio)
-        video.write_videofile(output_path, codec="libx264", audio_codec="aac")
-        logging.info(f"Video assembled and saved to {output_path}.")
+        engine = config.get('video_engine', 'moviepy')
+        if get_motion_settings(config)["enabled"] or get_transition_settings(config)["type"] != "none":
+            engine = 'ffmpeg (frame stream)'
+            _assemble_with_frames(image_paths, audio_path, output_path, config, durations)
+        elif engine == 'ffmpeg':
+            _assemble_with_ffmpeg(image_paths, audio_path, output_path, config, durations)
+        elif engine == 'moviepy':
+            _assemble_with_moviepy(image_paths, audio_path, output_path, config, durations)
+        else:
+            logging.error(f"Unknown video engine '{engine}'. Use 'moviepy' or 'ffmpeg'.")
+            return None
+        logging.info(f"Video assembled with {engine} and saved to {output_path}.")
         return output_path
     except Exception as e:
         logging.error(f"Error assembling video: {e}")